@@ -2,148 +2,105 @@
 # -*- coding: utf-8 -*-
 """Advent of Code 2019 day 11 module."""
 
-from collections import defaultdict
-from queue import Queue
+import numpy as np
 
+from intcode import HALTED, Channel, IntcodeVM
 
-def get_params(mem, input_params, modes, base):
-    params = []
-    for i, param in enumerate(input_params):
-        if i >= len(modes):
-            mode = 0
-        else:
-            mode = modes[i]
-        if mode == 0:
-            params.append(mem[param])
-        elif mode == 1:
-            params.append(param)
-        elif mode == 2:
-            params.append(mem[param+base])
-        else:
-            raise ValueError(f'unexpected mode {mode}')
-    return params
-
-
-def run_intcode(program, input_q):
-    pc = 0
-    output = None
-    relative_base = 0
-    mem = defaultdict(int)
-    for i, data in enumerate(program):
-        mem[i] = data
-    while pc in mem:
-        opcode = mem[pc] % 100
-        param_modes = [int(c) for c in str(mem[pc] // 100)]
-        param_modes.reverse()
-        if opcode == 99:
-            break
-        if opcode in (1, 2, 7, 8,):
-            a, b, c = (mem[pc+1], mem[pc+2], mem[pc+3])
-            params = get_params(mem, [a, b], param_modes, relative_base)
-            if len(param_modes) >= 3 and param_modes[2] == 2:
-                c += relative_base
-            if opcode == 1:
-                mem[c] = params[0] + params[1]
-            elif opcode == 2:
-                mem[c] = params[0] * params[1]
-            elif opcode == 7:
-                if params[0] < params[1]:
-                    mem[c] = 1
-                else:
-                    mem[c] = 0
-            elif opcode == 8:
-                if params[0] == params[1]:
-                    mem[c] = 1
-                else:
-                    mem[c] = 0
-            pc += 4
-        elif opcode in (3, 4, 9):
-            a = mem[pc+1]
-            if opcode == 3:
-                if input_q.empty():
-                    raise ValueError('input instruction w/empty input queue')
-                if param_modes and param_modes[0] == 2:
-                    a += relative_base
-                mem[a] = input_q.get()
-            else:
-                params = get_params(mem, [a], param_modes, relative_base)
-                if opcode == 4:
-                    output = params[0]
-                    yield output
-                elif opcode == 9:
-                    relative_base += params[0]
-            pc += 2
-        elif opcode in (5, 6):
-            a, b = (mem[pc+1], mem[pc+2])
-            params = get_params(mem, [a, b], param_modes, relative_base)
-            if (opcode == 5 and params[0] != 0) or (opcode == 6 and params[0] == 0):
-                pc = params[1]
-            else:
-                pc += 3
+
+WHITE = 1
+PAINTED = 2
+
+
+class Hull(object):
+    """Hull panels as a 2-D array of WHITE and PAINTED bits.
+
+    The array is indexed [y, x] relative to origin. When a panel outside
+    it is touched, only the axis which overflowed grows, toward the side
+    it overflowed on, by at least its current length.
+    """
+
+    def __init__(self, size=64):
+        self.cells = np.zeros((size, size), dtype=np.uint8)
+        self.origin = (size // 2, size // 2)
+
+    def _grow(self, axis, index):
+        size = self.cells.shape[axis]
+        extra = max(size, index - size + 1, -index)
+        pad = [(0, 0), (0, 0)]
+        if index < 0:
+            pad[axis] = (extra, 0)
+            origin = list(self.origin)
+            origin[axis] += extra
+            self.origin = tuple(origin)
         else:
-            raise ValueError(f'unexpected opcode {opcode}')
-    return output
+            pad[axis] = (0, extra)
+        self.cells = np.pad(self.cells, pad)
+
+    def _index(self, pos):
+        x, y = pos
+        for axis, n in enumerate((y, x)):
+            index = n + self.origin[axis]
+            if not 0 <= index < self.cells.shape[axis]:
+                self._grow(axis, index)
+        return y + self.origin[0], x + self.origin[1]
+
+    def __getitem__(self, pos):
+        # index first, as it may replace self.cells
+        idx = self._index(pos)
+        return self.cells[idx] & WHITE
+
+    def paint(self, pos, color):
+        idx = self._index(pos)
+        self.cells[idx] = PAINTED | color
+
+    def painted_count(self):
+        return int(np.count_nonzero(self.cells & PAINTED))
+
+    def render(self):
+        """Return the painted part of the hull as rows of '#' and ' ', top row first."""
+        painted = (self.cells & PAINTED) != 0
+        rows = np.flatnonzero(painted.any(axis=1))
+        cols = np.flatnonzero(painted.any(axis=0))
+        if not len(rows):
+            return ''
+        white = self.cells[rows[0]:rows[-1] + 1, cols[0]:cols[-1] + 1] & WHITE
+        chars = np.where(white[::-1] != 0, '#', ' ')
+        return '\n'.join(''.join(row) for row in chars)
 
 
 def paint(puzzle_input, starting_panel=0):
-    grid = {(0, 0): starting_panel}
+    hull = Hull()
+    hull.cells[hull._index((0, 0))] = starting_panel
     x = y = 0
     cur_dir = 0
-    painted = set()
-    q = Queue()
-    gen = run_intcode(list(puzzle_input), q)
+    q = Channel()
+    vm = IntcodeVM(list(puzzle_input), q)
     while True:
-        try:
-            cur_panel = grid.get((x, y), 0)
-            q.put(cur_panel)
-            color = next(gen)
-            grid[(x, y)] = color
-            painted.add((x, y))
-            turn = next(gen)
-            if turn == 0:
-                cur_dir = (cur_dir - 1) % 4
-            else:
-                cur_dir = (cur_dir + 1) % 4
-            if cur_dir == 0:
-                y += 1
-            elif cur_dir == 1:
-                x += 1
-            elif cur_dir == 2:
-                y -= 1
-            else:
-                x -= 1
-        except StopIteration:
+        q.put(hull[(x, y)])
+        status, out = vm.run(2)
+        if status == HALTED:
             break
-    return painted, grid
+        color, turn = out
+        hull.paint((x, y), color)
+        if turn == 0:
+            cur_dir = (cur_dir - 1) % 4
+        else:
+            cur_dir = (cur_dir + 1) % 4
+        if cur_dir == 0:
+            y += 1
+        elif cur_dir == 1:
+            x += 1
+        elif cur_dir == 2:
+            y -= 1
+        else:
+            x -= 1
+    return hull
 
 
 def process(puzzle_input, verbose=False):
     p1 = p2 = None
-    painted, _ = paint(puzzle_input)
-    p1 = len(painted)
-    painted, grid = paint(puzzle_input, 1)
-    min_x = max_x = None
-    min_y = max_y = None
-    for x, y in painted:
-        if min_x is None:
-            min_x = max_x = x
-            min_y = max_y = y
-        else:
-            min_x = min(min_x, x)
-            max_x = max(max_x, x)
-            min_y = min(min_y, y)
-            max_y = max(max_y, y)
-    out = ['']
-    for y in range(max_y, min_y - 1, -1):
-        line = []
-        for x in range(min_x, max_x + 1):
-            color = grid.get((x, y), 0)
-            if color == 0:
-                line.append(' ')
-            else:
-                line.append('#')
-        out.append(''.join(line))
-    p2 = '\n'.join(out)
+    p1 = paint(puzzle_input).painted_count()
+    p2 = '\n' + paint(puzzle_input, 1).render()
     return p1, p2
 
 
@@ -2,91 +2,51 @@
 # -*- coding: utf-8 -*-
 """Advent of Code 2019 day 13 module."""
 
-from collections import defaultdict
-
-
-def get_params(mem, input_params, modes, base):
-    params = []
-    for i, param in enumerate(input_params):
-        if i >= len(modes):
-            mode = 0
-        else:
-            mode = modes[i]
-        if mode == 0:
-            params.append(mem[param])
-        elif mode == 1:
-            params.append(param)
-        elif mode == 2:
-            params.append(mem[param+base])
-        else:
-            raise ValueError(f'unexpected mode {mode}')
-    return params
-
-
-def run_intcode(program, input_f=None):
-    pc = 0
-    output = None
-    relative_base = 0
-    mem = defaultdict(int)
-    for i, data in enumerate(program):
-        mem[i] = data
-    while pc in mem:
-        opcode = mem[pc] % 100
-        param_modes = [int(c) for c in str(mem[pc] // 100)]
-        param_modes.reverse()
-        if opcode == 99:
-            break
-        if opcode in (1, 2, 7, 8,):
-            a, b, c = (mem[pc+1], mem[pc+2], mem[pc+3])
-            params = get_params(mem, [a, b], param_modes, relative_base)
-            if len(param_modes) >= 3 and param_modes[2] == 2:
-                c += relative_base
-            if opcode == 1:
-                mem[c] = params[0] + params[1]
-            elif opcode == 2:
-                mem[c] = params[0] * params[1]
-            elif opcode == 7:
-                if params[0] < params[1]:
-                    mem[c] = 1
-                else:
-                    mem[c] = 0
-            elif opcode == 8:
-                if params[0] == params[1]:
-                    mem[c] = 1
-                else:
-                    mem[c] = 0
-            pc += 4
-        elif opcode in (3, 4, 9):
-            a = mem[pc+1]
-            if opcode == 3:
-                if not input_f:
-                    raise ValueError('no input func')
-                if param_modes and param_modes[0] == 2:
-                    a += relative_base
-                # print('read input')
-                mem[a] = input_f()
-            else:
-                params = get_params(mem, [a], param_modes, relative_base)
-                if opcode == 4:
-                    output = params[0]
-                    yield output
-                elif opcode == 9:
-                    relative_base += params[0]
-            pc += 2
-        elif opcode in (5, 6):
-            a, b = (mem[pc+1], mem[pc+2])
-            params = get_params(mem, [a, b], param_modes, relative_base)
-            if (opcode == 5 and params[0] != 0) or (opcode == 6 and params[0] == 0):
-                pc = params[1]
-            else:
-                pc += 3
-        else:
-            raise ValueError(f'unexpected opcode {opcode}')
-    return output
+from intcode import BLOCKED, HALTED, IntcodeVM
+
+
+class Game(object):
+    """Arcade cabinet state, updated incrementally from tile outputs.
+
+    Tracks the score, ball and paddle positions and the set of remaining
+    blocks. Unless headless, the full tile map is kept in tiles as well.
+    """
 
+    def __init__(self, headless=False):
+        self.tiles = None if headless else {}
+        self.blocks = set()
+        self.ball = None
+        self.paddle = None
+        self.score = 0
 
-def count_blocks(tiles):
-    return sum([v == 2 for v in tiles.values()])
+    def update(self, out):
+        tiles = self.tiles
+        blocks = self.blocks
+        for i in range(0, len(out), 3):
+            x, y, tile_id = out[i:i + 3]
+            if x == -1 and y == 0:
+                self.score = tile_id
+                continue
+            pos = (x, y)
+            if tiles is not None:
+                tiles[pos] = tile_id
+            if tile_id == 2:
+                blocks.add(pos)
+            else:
+                blocks.discard(pos)
+                if tile_id == 3:
+                    self.paddle = pos
+                elif tile_id == 4:
+                    self.ball = pos
+
+    def move(self):
+        """Return the joystick position which keeps the paddle under the ball."""
+        bx, px = self.ball[0], self.paddle[0]
+        if bx > px:
+            return 1
+        if bx < px:
+            return -1
+        return 0
 
 
 def print_tiles(tiles):
@@ -96,52 +56,38 @@ def print_tiles(tiles):
     for y in range(min(ys), max(ys) + 1):
         row = []
         for x in range(min(xs), max(xs) + 1):
-            tile_id = tiles[(x, y)]
+            tile_id = tiles.get((x, y), 0)
             row.append(tile[tile_id])
         rows.append(''.join(row))
     print('\n'.join(rows))
 
 
-def run_game(puzzle_input, play=False):
-    tiles = {}
-    score = 0
+def run_game(puzzle_input, play=False, headless=False):
+    """Run the game to completion and return the final Game state."""
+    game = Game(headless)
     prog = list(puzzle_input)
     if play:
         prog[0] = 2
-
-    def move():
-        for pos, tile_id in tiles.items():
-            if tile_id == 3:
-                px, _ = pos
-            elif tile_id == 4:
-                bx, _ = pos
-        if bx > px:
-            return 1
-        if bx < px:
-            return -1
-        return 0
-
-    gen = run_intcode(prog, input_f=move)
+    vm = IntcodeVM(prog)
     while True:
-        try:
-            x = next(gen)
-            y = next(gen)
-            tile_id = next(gen)
-            if x == -1 and y == 0:
-                score = tile_id
-            else:
-                tiles[(x, y)] = tile_id
-        except StopIteration:
+        # the game only blocks once a whole frame has been drawn
+        status, out = vm.run()
+        game.update(out)
+        if status == HALTED:
             break
-    return tiles, score
+        if status == BLOCKED:
+            vm.input_q.put(game.move())
+    return game
 
 
 def process(puzzle_input, verbose=False):
     p1 = p2 = None
-    tiles, _ = run_game(puzzle_input)
-    p1 = count_blocks(tiles)
-    _, score = run_game(puzzle_input, play=True)
-    p2 = score
+    game = run_game(puzzle_input, headless=not verbose)
+    if verbose:
+        print_tiles(game.tiles)
+    p1 = len(game.blocks)
+    game = run_game(puzzle_input, play=True, headless=True)
+    p2 = game.score
     return p1, p2
 
 
@@ -2,87 +2,10 @@
 # -*- coding: utf-8 -*-
 """Advent of Code 2019 day 15 module."""
 
-from collections import defaultdict
-from queue import Queue
-
-
-def get_params(mem, input_params, modes, base):
-    params = []
-    for i, param in enumerate(input_params):
-        if i >= len(modes):
-            mode = 0
-        else:
-            mode = modes[i]
-        if mode == 0:
-            params.append(mem[param])
-        elif mode == 1:
-            params.append(param)
-        elif mode == 2:
-            params.append(mem[param+base])
-        else:
-            raise ValueError(f'unexpected mode {mode}')
-    return params
-
-
-def run_intcode(program, input_q):
-    pc = 0
-    output = None
-    relative_base = 0
-    mem = defaultdict(int)
-    for i, data in enumerate(program):
-        mem[i] = data
-    while pc in mem:
-        opcode = mem[pc] % 100
-        param_modes = [int(c) for c in str(mem[pc] // 100)]
-        param_modes.reverse()
-        if opcode == 99:
-            break
-        if opcode in (1, 2, 7, 8,):
-            a, b, c = (mem[pc+1], mem[pc+2], mem[pc+3])
-            params = get_params(mem, [a, b], param_modes, relative_base)
-            if len(param_modes) >= 3 and param_modes[2] == 2:
-                c += relative_base
-            if opcode == 1:
-                mem[c] = params[0] + params[1]
-            elif opcode == 2:
-                mem[c] = params[0] * params[1]
-            elif opcode == 7:
-                if params[0] < params[1]:
-                    mem[c] = 1
-                else:
-                    mem[c] = 0
-            elif opcode == 8:
-                if params[0] == params[1]:
-                    mem[c] = 1
-                else:
-                    mem[c] = 0
-            pc += 4
-        elif opcode in (3, 4, 9):
-            a = mem[pc+1]
-            if opcode == 3:
-                if input_q.empty():
-                    raise ValueError('input instruction w/empty input queue')
-                if param_modes and param_modes[0] == 2:
-                    a += relative_base
-                mem[a] = input_q.get()
-            else:
-                params = get_params(mem, [a], param_modes, relative_base)
-                if opcode == 4:
-                    output = params[0]
-                    yield output
-                elif opcode == 9:
-                    relative_base += params[0]
-            pc += 2
-        elif opcode in (5, 6):
-            a, b = (mem[pc+1], mem[pc+2])
-            params = get_params(mem, [a, b], param_modes, relative_base)
-            if (opcode == 5 and params[0] != 0) or (opcode == 6 and params[0] == 0):
-                pc = params[1]
-            else:
-                pc += 3
-        else:
-            raise ValueError(f'unexpected opcode {opcode}')
-    return output
+from collections import deque
+
+from gridsearch import bfs, grid_neighbors
+from intcode import Channel, IntcodeVM
 
 
 def get_direction(pos, dst):
@@ -97,14 +20,22 @@ def get_direction(pos, dst):
     raise ValueError('pos/dst must be adjacent points')
 
 
-def print_grid(grid):
+def compact_grid(grid):
+    """Return the map as a list of row strings and the (x, y) of the droid's start.
+
+    Unexplored cells are walls.
+    """
     xs, ys = zip(*grid.keys())
-    rows = []
-    for y in range(min(ys), max(ys) + 1):
-        row = []
-        for x in range(min(xs), max(xs) + 1):
-            row.append(grid.get((x, y), '#'))
-        rows.append(''.join(row))
+    min_x, min_y = min(xs), min(ys)
+    width = max(xs) - min_x + 1
+    rows = [bytearray(b'#' * width) for _ in range(max(ys) - min_y + 1)]
+    for (x, y), c in grid.items():
+        rows[y - min_y][x - min_x] = ord(c)
+    return [row.decode() for row in rows], (-min_x, -min_y)
+
+
+def print_grid(grid):
+    rows, _ = compact_grid(grid)
     print('\n'.join(rows))
 
 
@@ -114,71 +45,44 @@ def adjacent(pos):
         yield point
 
 
-def neighbors(grid, pos):
-    for point in adjacent(pos):
-        if grid[point] != '#':
-            yield point
-
+def make_grid(puzzle_input):
+    """Map the area breadth first.
 
-def map_adjacent(grid, pos, gen, q):
-    for point in adjacent(pos):
-        if point not in grid:
-            q.put(get_direction(pos, point))
-            status = next(gen)
+    Every open cell keeps the droid VM which reached it, and each of its
+    unexplored neighbours is probed from a fork of that VM, so the droid
+    never has to walk back.
+    """
+    grid = {(0, 0): 'D'}
+    queue = deque([((0, 0), IntcodeVM(list(puzzle_input), Channel()))])
+    while queue:
+        pos, vm = queue.popleft()
+        for point in adjacent(pos):
+            if point in grid:
+                continue
+            droid = vm.fork(Channel())
+            droid.input_q.put(get_direction(pos, point))
+            _, (status,) = droid.run(1)
             if status == 0:
                 grid[point] = '#'
             elif status <= 2:
-                if status == 1:
-                    grid[point] = '.'
-                else:
-                    grid[point] = 'O'
-                map_adjacent(grid, point, gen, q)
-                q.put(get_direction(point, pos))
-                next(gen)
+                grid[point] = '.' if status == 1 else 'O'
+                queue.append((point, droid))
             else:
                 raise ValueError('unexpected droid status')
-
-
-def make_grid(puzzle_input):
-    grid = {(0, 0): 'D'}
-    x = y = 0
-    q = Queue()
-    gen = run_intcode(list(puzzle_input), q)
-    map_adjacent(grid, (x, y), gen, q)
     return grid
 
 
-def dijkstra(grid, src, dst=None):
-    dist = {k: len(grid) for k, v in grid.items() if v != '#'}
-    prev = {k: None for k, v in grid.items() if v != '#'}
-    unvisited = set(dist.keys())
-    dist[src] = 0
-
-    while unvisited:
-        pos = sorted(list(unvisited), key=lambda x: dist[x])[0]
-        unvisited.remove(pos)
-        if dst is not None and pos == dst:
-            break
-        for point in neighbors(grid, pos):
-            alt = dist[pos] + 1
-            if alt < dist[point]:
-                dist[point] = alt
-                prev[point] = pos
-    return dist, prev
-
-
 def process(puzzle_input, verbose=False):
     p1 = p2 = None
-    grid = make_grid(puzzle_input)
-    dst = None
-    for k, v in grid.items():
-        if v == 'O':
-            dst = k
-            break
-    dist, _ = dijkstra(grid, (0, 0), dst)
+    rows, start = compact_grid(make_grid(puzzle_input))
+    if verbose:
+        print('\n'.join(rows))
+    dst = next((x, y) for y, row in enumerate(rows) for x, c in enumerate(row) if c == 'O')
+    neighbors = grid_neighbors(rows)
+    dist, _ = bfs(start, neighbors, dst)
     p1 = dist[dst]
-    dist, _ = dijkstra(grid, dst)
-    p2 = sorted(dist.values())[-1]
+    dist, _ = bfs(dst, neighbors)
+    p2 = max(dist.values())
     return p1, p2
 
 
@@ -2,87 +2,7 @@
 # -*- coding: utf-8 -*-
 """Advent of Code 2019 day 17 module."""
 
-from collections import defaultdict
-from queue import Queue
-
-
-def get_params(mem, input_params, modes, base):
-    params = []
-    for i, param in enumerate(input_params):
-        if i >= len(modes):
-            mode = 0
-        else:
-            mode = modes[i]
-        if mode == 0:
-            params.append(mem[param])
-        elif mode == 1:
-            params.append(param)
-        elif mode == 2:
-            params.append(mem[param+base])
-        else:
-            raise ValueError(f'unexpected mode {mode}')
-    return params
-
-
-def run_intcode(program, input_q):
-    pc = 0
-    output = None
-    relative_base = 0
-    mem = defaultdict(int)
-    for i, data in enumerate(program):
-        mem[i] = data
-    while pc in mem:
-        opcode = mem[pc] % 100
-        param_modes = [int(c) for c in str(mem[pc] // 100)]
-        param_modes.reverse()
-        if opcode == 99:
-            break
-        if opcode in (1, 2, 7, 8,):
-            a, b, c = (mem[pc+1], mem[pc+2], mem[pc+3])
-            params = get_params(mem, [a, b], param_modes, relative_base)
-            if len(param_modes) >= 3 and param_modes[2] == 2:
-                c += relative_base
-            if opcode == 1:
-                mem[c] = params[0] + params[1]
-            elif opcode == 2:
-                mem[c] = params[0] * params[1]
-            elif opcode == 7:
-                if params[0] < params[1]:
-                    mem[c] = 1
-                else:
-                    mem[c] = 0
-            elif opcode == 8:
-                if params[0] == params[1]:
-                    mem[c] = 1
-                else:
-                    mem[c] = 0
-            pc += 4
-        elif opcode in (3, 4, 9):
-            a = mem[pc+1]
-            if opcode == 3:
-                if input_q.empty():
-                    raise ValueError('input instruction w/empty input queue')
-                if param_modes and param_modes[0] == 2:
-                    a += relative_base
-                mem[a] = input_q.get()
-            else:
-                params = get_params(mem, [a], param_modes, relative_base)
-                if opcode == 4:
-                    output = params[0]
-                    yield output
-                elif opcode == 9:
-                    relative_base += params[0]
-            pc += 2
-        elif opcode in (5, 6):
-            a, b = (mem[pc+1], mem[pc+2])
-            params = get_params(mem, [a, b], param_modes, relative_base)
-            if (opcode == 5 and params[0] != 0) or (opcode == 6 and params[0] == 0):
-                pc = params[1]
-            else:
-                pc += 3
-        else:
-            raise ValueError(f'unexpected opcode {opcode}')
-    return output
+from intcode import Channel, IntcodeVM
 
 
 def adjacent(pos):
@@ -101,16 +21,8 @@ def neighbors(grid, pos):
 
 
 def make_grid(puzzle_input):
-    q = Queue()
-    gen = run_intcode(list(puzzle_input), q)
-    grid = []
-    while True:
-        try:
-            c = next(gen)
-            grid.append(chr(c))
-        except StopIteration:
-            break
-    return list(''.join(grid).split('\n'))
+    _, out = IntcodeVM(list(puzzle_input), Channel()).run()
+    return list(''.join(map(chr, out)).split('\n'))
 
 
 def find_intersections(grid):
@@ -191,30 +103,66 @@ def get_route(grid):
     return route
 
 
+def compress_route(route, functions=3, max_len=20):
+    """Split route into a main routine and movement functions.
+
+    Returns (main, [A, B, C]) where main is a list of function names and
+    each function a list of route commands, such that every routine fits
+    in max_len characters, or None if there is no such split. Functions
+    are chosen in the order they first appear in the route, so the search
+    only ever has to try prefixes of the remaining route, and positions
+    which are known to fail with a given set of functions and as many
+    calls left are skipped.
+    """
+    route = tuple(route)
+    names = 'ABCDEFGHIJ'[:functions]
+    max_calls = (max_len + 1) // 2
+    # fewest calls made so far with which (i, funcs) is known to fail
+    failed = {}
+
+    def _search(i, funcs, main):
+        if i == len(route):
+            return main, funcs
+        if len(main) == max_calls or len(main) >= failed.get((i, funcs), max_calls):
+            return None
+        for n, f in enumerate(funcs):
+            if route[i:i + len(f)] == f:
+                found = _search(i + len(f), funcs, main + [names[n]])
+                if found:
+                    return found
+        if len(funcs) < functions:
+            for j in range(i + 1, len(route) + 1):
+                f = route[i:j]
+                if len(','.join(f)) > max_len:
+                    break
+                found = _search(j, funcs + (f,), main + [names[len(funcs)]])
+                if found:
+                    return found
+        failed[(i, funcs)] = min(len(main), failed.get((i, funcs), max_calls))
+        return None
+
+    found = _search(0, (), [])
+    if found is None:
+        return None
+    main, funcs = found
+    funcs = [list(f) for f in funcs]
+    funcs.extend([] for _ in range(functions - len(funcs)))
+    return main, funcs
+
+
 def run_movement(puzzle_input, main, a, b, c):
-    q = Queue()
+    q = Channel()
     prog = list(puzzle_input)
     prog[0] = 2
-    for i, x in enumerate('{}\n'.format(','.join(main))):
-        q.put(ord(x))
+    q.extend('{}\n'.format(','.join(main)))
     for f in a, b, c:
-        for i, x in enumerate('{}\n'.format(','.join(f))):
-            q.put(ord(x))
-    q.put(ord('n'))
-    q.put(ord('\n'))
-    msg = []
-    gen = run_intcode(prog, q)
+        q.extend('{}\n'.format(','.join(f)))
+    q.extend('n\n')
+    _, output = IntcodeVM(prog, q).run()
     out = 0
-    while True:
-        try:
-            c = next(gen)
-            if c > 127:
-                out = c
-            else:
-                msg.append(chr(c))
-        except StopIteration:
-            break
-    print(''.join(msg))
+    if output and output[-1] > 127:
+        out = output.pop()
+    print(''.join(map(chr, output)))
     return out
 
 
@@ -224,27 +172,13 @@ def process(puzzle_input, verbose=False):
     print('\n'.join(grid))
     p1 = sum([x * y for x, y in find_intersections(grid)])
     route = get_route(grid)
-    route_s = ''.join(route)
-    a = ['L', '12', 'L', '10', 'R', '8', 'L', '12']
-    a_s = ''.join(a)
-    b = ['R', '8', 'R', '10', 'R', '12']
-    b_s = ''.join(b)
-    c = ['L', '10', 'R', '12', 'R', '8']
-    c_s = ''.join(c)
-    i = 0
-    moves = []
-    while i < len(route_s):
-        if route_s[i:].startswith(a_s):
-            moves.append('A')
-            i += len(a_s)
-        elif route_s[i:].startswith(b_s):
-            moves.append('B')
-            i += len(b_s)
-        elif route_s[i:].startswith(c_s):
-            moves.append('C')
-            i += len(c_s)
-        else:
-            raise ValueError('cannot make movement routine')
+    found = compress_route(route)
+    if found is None:
+        raise ValueError('cannot make movement routine')
+    moves, (a, b, c) = found
+    if verbose:
+        for name, f in zip('MABC', [moves, a, b, c]):
+            print(f'{name}: {",".join(f)}')
     p2 = run_movement(puzzle_input, moves, a, b, c)
     return p1, p2
 
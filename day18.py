@@ -2,47 +2,12 @@
 # -*- coding: utf-8 -*-
 """Advent of Code 2019 day 18 module."""
 
+from array import array
+from functools import partial
+from heapq import heappush, heappop
 from string import ascii_lowercase, ascii_uppercase
 
-
-def adjacent(pos):
-    x, y = pos
-    for point in [(x + 1, y), (x - 1, y), (x, y + 1), (x, y - 1)]:
-        yield point
-
-
-def neighbors(grid, pos):
-    for point in adjacent(pos):
-        x, y = point
-        if y < 0 or x < 0 or y >= len(grid) or x >= len(grid[0]):
-            continue
-        c = grid[y][x]
-        if c != '#':
-            yield point
-
-
-def dijkstra(grid, src, dst=None):
-    dist = {}
-    prev = {}
-    for y, row in enumerate(grid):
-        for x, c in enumerate(row):
-            if c != '#':
-                dist[(x, y)] = len(grid) * len(grid[0])
-                prev[(x, y)] = None
-    unvisited = set(dist.keys())
-    dist[src] = 0
-
-    while unvisited:
-        pos = sorted(list(unvisited), key=lambda x: dist[x])[0]
-        unvisited.remove(pos)
-        if dst is not None and pos == dst:
-            break
-        for point in neighbors(grid, pos):
-            alt = dist[pos] + 1
-            if alt < dist[point]:
-                dist[point] = alt
-                prev[point] = pos
-    return dist, prev
+from parallel import parallel_search
 
 
 def parse_grid(grid, p2=False):
@@ -60,107 +25,201 @@ def parse_grid(grid, p2=False):
     return start, keys, doors
 
 
-def key_distances(grid, start, keys, doors):
-    """Return distance start to any keys, and doors that must be passed."""
-    dist, prev = dijkstra(grid, start)
-    dest_keys = {}
-    for k, pos in keys.items():
-        if pos == start:
-            continue
-        p = pos
-        if prev[pos] is None:
-            continue
-        needed_keys = set()
-        while p != start:
-            p = prev[p]
-            if p in doors.values():
-                needed_keys.add(grid[p[1]][p[0]].lower())
-        dest_keys[k] = (dist[pos], frozenset(needed_keys))
-    return dest_keys
-
-
-def min_route_dist(robot_keys, key_dists):
-
-    known_dists = {}
-
-    def _min_dist(keys, remaining_keys):
-        nonlocal key_dists
-        nonlocal known_dists
-        if (keys, remaining_keys) in known_dists:
-            return known_dists[(keys, remaining_keys)]
+def key_bfs(cells, width, cell_bits, targets, src):
+    """Breadth first search from cell index src over a flattened grid.
 
-        min_dist = None
-        for k in remaining_keys:
-            for robot_key in keys:
-                if k not in key_dists[robot_key]:
-                    continue
-                dist, needed_keys = key_dists[robot_key][k]
-                if needed_keys.intersection(remaining_keys):
+    cells holds 1 for every open cell and cell_bits the key mask bit of
+    every key or door cell. Returns the distance to each cell index in
+    targets (-1 if unreachable), and the mask of keys and doors passed
+    on the way there. The grid must be surrounded by walls.
+    """
+    dist = array('i', [-1]) * len(cells)
+    needed = [0] * len(cells)
+    dist[src] = 0
+    order = [src]
+    for idx in order:
+        d = dist[idx] + 1
+        mask = needed[idx]
+        if idx != src:
+            mask |= cell_bits[idx]
+        for n in (idx + 1, idx - 1, idx + width, idx - width):
+            if cells[n] and dist[n] < 0:
+                dist[n] = d
+                needed[n] = mask
+                order.append(n)
+    return [dist[t] for t in targets], [needed[t] for t in targets]
+
+
+def key_matrix(grid, starts, keys, workers=1):
+    """Return distances and required key masks between all starts and keys.
+
+    Runs one BFS per robot start and per key (optionally in a process
+    pool). For node i (the starts, then the keys in name order) and key
+    k, dist[i * len(keys) + k] is the distance (-1 if unreachable) and
+    req[i * len(keys) + k] the mask of keys needed first: those opening
+    the doors on the way, and any keys passed on the way.
+    """
+    width = len(grid[0])
+    names = sorted(keys)
+    bits = {k: 1 << i for i, k in enumerate(names)}
+    flat = [c for row in grid for c in row]
+    cells = bytes(c != '#' for c in flat)
+    cell_bits = [bits.get(c.lower(), 0) for c in flat]
+    targets = [keys[k][1] * width + keys[k][0] for k in names]
+    sources = [y * width + x for x, y in starts] + targets
+    results = parallel_search(partial(key_bfs, cells, width, cell_bits, targets), sources, workers=workers)
+    dist = array('i')
+    req = array('q')
+    for _, (d, r) in results:
+        dist.extend(d)
+        req.extend(r)
+    return dist, req
+
+
+def key_graph(robots, key_count, dist, req):
+    """Return, for each node, (node, key bit, distance, required key mask) edges."""
+    edges = []
+    for i in range(robots + key_count):
+        node_edges = []
+        for k in range(key_count):
+            d = dist[i * key_count + k]
+            if d > 0:
+                node_edges.append((robots + k, k, d, req[i * key_count + k]))
+        edges.append(node_edges)
+    return edges
+
+
+def mst_heuristic(r, key_count, dist):
+    """Return an admissible estimate function for the key search.
+
+    The estimate for a state is the weight of a minimum spanning tree
+    over the uncollected keys plus one node for the robots, using the
+    key_matrix distances (which ignore doors). The robots' remaining
+    walks connect all of those nodes, so they can never be shorter.
+    Estimates are None for states which can no longer collect every key.
+    """
+    n = r + key_count
+    powers = [n ** i for i in range(r)]
+    cache = {}
+
+    def estimate(pos, mask):
+        remaining = [k for k in range(key_count) if not mask >> k & 1]
+        key = (pos, mask)
+        if key in cache:
+            return cache[key]
+        robots = [pos // powers[i] % n for i in range(r)]
+        # cost of joining each key to the tree, starting from the robots
+        cost = {}
+        for k in remaining:
+            ds = [dist[node * key_count + k] for node in robots]
+            ds = [d for d in ds if d >= 0]
+            cost[k] = min(ds) if ds else None
+        total = 0
+        while cost:
+            k = min((k for k in cost if cost[k] is not None), key=cost.get, default=None)
+            if k is None:
+                cache[key] = None
+                return None
+            total += cost.pop(k)
+            row = (r + k) * key_count
+            for j in cost:
+                d = dist[row + j]
+                if d >= 0 and (cost[j] is None or d < cost[j]):
+                    cost[j] = d
+        cache[key] = total
+        return total
+
+    return estimate
+
+
+def min_route_dist(r, key_count, edges, heuristic=None, stats=None):
+    """Return the fewest steps for r robots to collect every key.
+
+    Dijkstra over (robot positions, collected key mask) states, where a
+    robot is always at its start or at the last key it collected, or A*
+    if given a consistent heuristic(pos, mask). The best known distance
+    per state is kept in a table indexed by the encoded robot positions,
+    holding a dict keyed by key mask. If stats is a dict, the number of
+    expanded and queued states are stored in it.
+    """
+    n = len(edges)
+    powers = [n ** i for i in range(r)]
+    full = (1 << key_count) - 1
+    # the robots start at nodes 0..r-1
+    start = sum(i * powers[i] for i in range(r))
+    best = [None] * n ** r
+    best[start] = {0: 0}
+    heap = [(0, 0, 0, start)]
+    expanded = queued = 0
+    result = None
+    while heap:
+        _, dist, mask, pos = heappop(heap)
+        if mask == full:
+            result = dist
+            break
+        if best[pos][mask] < dist:
+            continue
+        expanded += 1
+        for i in range(r):
+            node = pos // powers[i] % n
+            for dst, bit, d, required in edges[node]:
+                if mask >> bit & 1 or required & ~mask:
                     continue
-                new_remaining = set(remaining_keys)
-                new_remaining.remove(k)
-                new_keys = set(keys)
-                new_keys.remove(robot_key)
-                new_keys.add(k)
-                if new_remaining:
-                    dist += _min_dist(frozenset(new_keys), frozenset(new_remaining))
-                if min_dist is None:
-                    min_dist = dist
-                else:
-                    min_dist = min(dist, min_dist)
-        known_dists[(keys, remaining_keys)] = min_dist
-        return min_dist
-
-    min_dist = None
-    for robot_key in robot_keys:
-        for key, (dist, needed_keys) in key_dists[robot_key].items():
-            if needed_keys:
-                continue
-            remaining = set([k for k in key_dists if not k.startswith('@')])
-            remaining.remove(key)
-            keys = set(robot_keys)
-            keys.remove(robot_key)
-            keys.add(key)
-            dist += _min_dist(frozenset(keys), frozenset(remaining))
-            if min_dist is None:
-                min_dist = dist
-            else:
-                min_dist = min(dist, min_dist)
-
-    return min_dist
-
-
-def process(puzzle_input, verbose=False):
+                new_mask = mask | 1 << bit
+                new_pos = pos + (dst - node) * powers[i]
+                new_dist = dist + d
+                table = best[new_pos]
+                if table is None:
+                    table = best[new_pos] = {}
+                if new_dist < table.get(new_mask, new_dist + 1):
+                    estimate = new_dist
+                    if heuristic is not None:
+                        h = heuristic(new_pos, new_mask)
+                        if h is None:
+                            continue
+                        estimate += h
+                    table[new_mask] = new_dist
+                    heappush(heap, (estimate, new_dist, new_mask, new_pos))
+                    queued += 1
+    if stats is not None:
+        stats['expanded'] = expanded
+        stats['queued'] = queued
+    return result
+
+
+def collect_keys(grid, starts, keys, workers=1, astar=False, stats=None):
+    dist, req = key_matrix(grid, starts, keys, workers)
+    edges = key_graph(len(starts), len(keys), dist, req)
+    heuristic = mst_heuristic(len(starts), len(keys), dist) if astar else None
+    return min_route_dist(len(starts), len(keys), edges, heuristic, stats)
+
+
+def process(puzzle_input, verbose=False, workers=1, astar=False):
     p1 = p2 = None
     grid = [list(row) for row in puzzle_input]
-    start, keys, doors = parse_grid(grid)
-    robots = [('@', start)]
-    key_dists = {}
-    for i, (key, pos) in enumerate(robots):
-        key_dists[key] = key_distances(grid, pos, keys, doors)
-    for k, pos in keys.items():
-        key_dists[k] = key_distances(grid, pos, keys, doors)
-    p1 = min_route_dist(['@'], key_dists)
+    start, keys, _ = parse_grid(grid)
+    stats = {}
+    p1 = collect_keys(grid, [start], keys, workers, astar, stats)
+    if verbose:
+        print(f'part one: {stats["expanded"]} states expanded, {stats["queued"]} queued')
 
     robots = []
     x, y = start
-    for i, pos in enumerate([(x - 1, y - 1), (x + 1, y - 1), (x - 1, y + 1), (x + 1, y + 1)]):
+    for pos in [(x - 1, y - 1), (x + 1, y - 1), (x - 1, y + 1), (x + 1, y + 1)]:
         x, y = pos
-        key = f'@{i}'
         grid[y][x] = '@'
-        robots.append((key, pos))
+        robots.append(pos)
     x, y = start
     for pos in [(x, y - 1), (x - 1, y), (x, y), (x + 1, y), (x, y + 1)]:
         x, y = pos
         grid[y][x] = '#'
+    p2 = collect_keys(grid, robots, keys, workers, astar, stats)
+    if verbose:
+        print(f'part two: {stats["expanded"]} states expanded, {stats["queued"]} queued')
 
-    key_dists = {}
-    for i, (key, pos) in enumerate(robots):
-        key_dists[key] = key_distances(grid, pos, keys, doors)
-    for k, pos in keys.items():
-        key_dists[k] = key_distances(grid, pos, keys, doors)
-    p2 = min_route_dist([k for k, pos in robots], key_dists)
-
+    if verbose:
+        import resource
+        print(f'peak memory: {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // 1024} MiB')
     return p1, p2
 
 
@@ -173,10 +232,13 @@ def main():
     parser.add_argument('infile', help='input file to read ("-" for stdin)')
     parser.add_argument('-v', '--verbose', '-d', '--debug',
                         action='store_true', dest='verbose', help='verbose output')
+    parser.add_argument('-j', '--workers', type=int, default=1,
+                        help='number of worker processes (0 for one per CPU)')
+    parser.add_argument('--astar', action='store_true', help='guide the key search with an MST heuristic')
     args = parser.parse_args()
     try:
         puzzle_input = [line.strip() for line in fileinput.input(args.infile) if line.strip()]
-        p1, p2 = process(puzzle_input, verbose=args.verbose)
+        p1, p2 = process(puzzle_input, verbose=args.verbose, workers=args.workers or None, astar=args.astar)
         print(f'Part one: {p1}')
         print(f'Part two: {p2}')
     except KeyboardInterrupt:
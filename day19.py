@@ -2,111 +2,125 @@
 # -*- coding: utf-8 -*-
 """Advent of Code 2019 day 19 module."""
 
-from collections import defaultdict
-from queue import Queue
-
-
-def get_params(mem, input_params, modes, base):
-    params = []
-    for i, param in enumerate(input_params):
-        if i >= len(modes):
-            mode = 0
-        else:
-            mode = modes[i]
-        if mode == 0:
-            params.append(mem[param])
-        elif mode == 1:
-            params.append(param)
-        elif mode == 2:
-            params.append(mem[param+base])
-        else:
-            raise ValueError(f'unexpected mode {mode}')
-    return params
-
-
-def run_intcode(program, input_q):
-    pc = 0
-    output = None
-    relative_base = 0
-    mem = defaultdict(int)
-    for i, data in enumerate(program):
-        mem[i] = data
-    while pc in mem:
-        opcode = mem[pc] % 100
-        param_modes = [int(c) for c in str(mem[pc] // 100)]
-        param_modes.reverse()
-        if opcode == 99:
-            break
-        if opcode in (1, 2, 7, 8,):
-            a, b, c = (mem[pc+1], mem[pc+2], mem[pc+3])
-            params = get_params(mem, [a, b], param_modes, relative_base)
-            if len(param_modes) >= 3 and param_modes[2] == 2:
-                c += relative_base
-            if opcode == 1:
-                mem[c] = params[0] + params[1]
-            elif opcode == 2:
-                mem[c] = params[0] * params[1]
-            elif opcode == 7:
-                if params[0] < params[1]:
-                    mem[c] = 1
-                else:
-                    mem[c] = 0
-            elif opcode == 8:
-                if params[0] == params[1]:
-                    mem[c] = 1
-                else:
-                    mem[c] = 0
-            pc += 4
-        elif opcode in (3, 4, 9):
-            a = mem[pc+1]
-            if opcode == 3:
-                if input_q.empty():
-                    raise ValueError('input instruction w/empty input queue')
-                if param_modes and param_modes[0] == 2:
-                    a += relative_base
-                mem[a] = input_q.get()
-            else:
-                params = get_params(mem, [a], param_modes, relative_base)
-                if opcode == 4:
-                    output = params[0]
-                    yield output
-                elif opcode == 9:
-                    relative_base += params[0]
-            pc += 2
-        elif opcode in (5, 6):
-            a, b = (mem[pc+1], mem[pc+2])
-            params = get_params(mem, [a, b], param_modes, relative_base)
-            if (opcode == 5 and params[0] != 0) or (opcode == 6 and params[0] == 0):
-                pc = params[1]
-            else:
-                pc += 3
-        else:
-            raise ValueError(f'unexpected opcode {opcode}')
-    return output
-
-
-pos_cache = {}
-
-
-def check_pos(puzzle_input, pos):
-    if pos in pos_cache:
-        return pos_cache[pos]
+import hashlib
+import sqlite3
+from collections import OrderedDict
+
+import numpy as np
+
+from intcode import Channel, IntcodeVM
+from intcode_batch import run_batch
+
+
+warm_cache = {}
+
+
+class ProbeCache(object):
+    """LRU cache of beam probe results for one drone program.
+
+    Holds at most maxsize probes in memory. With a path, probes are also
+    stored in an sqlite database keyed by a hash of the program, so later
+    runs on the same input can skip probing. New probes are written to the
+    database every maxsize probes and on close(); use the cache as a
+    context manager to close it even if probing fails.
+    """
+
+    def __init__(self, program, maxsize=1 << 16, path=None):
+        self.program_hash = hashlib.sha256(','.join(map(str, program)).encode()).hexdigest()
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._probes = OrderedDict()
+        self._pending = []
+        self._db = None
+        if path is not None:
+            self._db = sqlite3.connect(path)
+            self._db.execute('CREATE TABLE IF NOT EXISTS probes (program TEXT, x INTEGER, y INTEGER, '
+                             'value INTEGER, PRIMARY KEY (program, x, y)) WITHOUT ROWID')
+
+    def __len__(self):
+        return len(self._probes)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _store(self, pos, value):
+        self._probes[pos] = value
+        if len(self._probes) > self.maxsize:
+            self._probes.popitem(last=False)
+
+    def get(self, pos):
+        """Return the cached probe result for pos, or None."""
+        value = self._probes.get(pos)
+        if value is not None:
+            self._probes.move_to_end(pos)
+            self.hits += 1
+            return value
+        if self._db is not None:
+            row = self._db.execute('SELECT value FROM probes WHERE program = ? AND x = ? AND y = ?',
+                                   (self.program_hash, *pos)).fetchone()
+            if row is not None:
+                self._store(pos, row[0])
+                self.hits += 1
+                return row[0]
+        self.misses += 1
+        return None
+
+    def put(self, pos, value):
+        self._store(pos, value)
+        if self._db is not None:
+            self._pending.append((self.program_hash, *pos, value))
+            if len(self._pending) >= self.maxsize:
+                self.flush()
+
+    def flush(self):
+        if self._db is not None and self._pending:
+            self._db.executemany('INSERT OR REPLACE INTO probes VALUES (?, ?, ?, ?)', self._pending)
+            self._db.commit()
+            self._pending = []
+
+    def close(self):
+        if self._db is not None:
+            self.flush()
+            self._db.close()
+            self._db = None
+
+
+def warm_state(puzzle_input):
+    """Return a snapshot of the drone program waiting for its first input."""
+    key = tuple(puzzle_input)
+    if key not in warm_cache:
+        vm = IntcodeVM(puzzle_input, Channel(), jit=True)
+        vm.run()
+        warm_cache[key] = vm.snapshot()
+    return warm_cache[key]
+
+
+def check_pos(drone, cache, pos):
+    n = cache.get(pos)
+    if n is not None:
+        return n
     x, y = pos
-    q = Queue()
-    gen = run_intcode(list(puzzle_input), q)
+    q = Channel()
     q.put(x)
     q.put(y)
-    pos_cache[pos] = next(gen)
-    return pos_cache[pos]
-
-
-def make_grid(puzzle_input):
-    grid = []
-    for y in range(50):
-        row = []
-        for x in range(50):
-            row.append(check_pos(puzzle_input, (x, y)))
-        grid.append(row)
+    vm = IntcodeVM.from_snapshot(drone, q)
+    _, (n,) = vm.run(1)
+    cache.put(pos, n)
+    return n
+
+
+def make_grid(puzzle_input, cache, size=50):
+    grid = [[cache.get((x, y)) for x in range(size)] for y in range(size)]
+    missing = [(x, y) for y, row in enumerate(grid) for x, n in enumerate(row) if n is None]
+    if missing:
+        vm = run_batch(puzzle_input, inputs=np.array(missing))
+        for (x, y), n in zip(missing, vm.out[:, 0].tolist()):
+            grid[y][x] = n
+            cache.put((x, y), n)
     return grid
 
 
@@ -121,37 +135,41 @@ def print_grid(grid):
         print(''.join(out))
 
 
-def find_square(puzzle_input, size=100):
+def find_square(drone, cache, size=100):
     y = -1 + size
     x_start = 0
     while True:
         y += 1
         for x in range(x_start, y + 1):
-            n = check_pos(puzzle_input, (x, y))
+            n = check_pos(drone, cache, (x, y))
             if n:
                 x_start = x
                 break
         else:
             continue
-        if not check_pos(puzzle_input, (x_start + size - 1, y)):
+        if not check_pos(drone, cache, (x_start + size - 1, y)):
             continue
         width = 10
-        while check_pos(puzzle_input, (x_start + width, y)):
+        while check_pos(drone, cache, (x_start + width, y)):
             width += 1
         for x in range(x_start, x_start + width - size + 1):
-            if not check_pos(puzzle_input, (x, y + size - 1)):
+            if not check_pos(drone, cache, (x, y + size - 1)):
                 continue
             return x, y
 
 
-def process(puzzle_input, verbose=False):
+def process(puzzle_input, verbose=False, cache_path=None):
     p1 = p2 = None
-    grid = make_grid(puzzle_input)
-    print_grid(grid)
-    p1 = sum([n for row in grid for n in row])
-    x, y = find_square(puzzle_input)
-    print(f'({x}, {y})')
-    p2 = x * 10000 + y
+    drone = warm_state(puzzle_input)
+    with ProbeCache(puzzle_input, path=cache_path) as cache:
+        grid = make_grid(puzzle_input, cache)
+        print_grid(grid)
+        p1 = sum([n for row in grid for n in row])
+        x, y = find_square(drone, cache)
+        print(f'({x}, {y})')
+        p2 = x * 10000 + y
+        if verbose:
+            print(f'probe cache: {cache.hits} hits, {cache.misses} misses')
     return p1, p2
 
 
@@ -164,10 +182,11 @@ def main():
     parser.add_argument('infile', help='input file to read ("-" for stdin)')
     parser.add_argument('-v', '--verbose', '-d', '--debug',
                         action='store_true', dest='verbose', help='verbose output')
+    parser.add_argument('--cache', metavar='PATH', help='sqlite file to keep beam probes in between runs')
     args = parser.parse_args()
     try:
         puzzle_input = [int(x) for x in ''.join(fileinput.input(args.infile)).split(',') if x.strip()]
-        p1, p2 = process(puzzle_input, verbose=args.verbose)
+        p1, p2 = process(puzzle_input, verbose=args.verbose, cache_path=args.cache)
         print(f'Part one: {p1}')
         print(f'Part two: {p2}')
     except KeyboardInterrupt:
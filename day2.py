@@ -2,44 +2,165 @@
 # -*- coding: utf-8 -*-
 """Advent of Code 2019 day 2 module."""
 
+from functools import partial
 
-from tqdm import tqdm
+import numpy as np
 
+from intcode import IntcodeVM, decode_word
+from intcode_batch import run_batch
+from parallel import parallel_search
 
-def run_intcode(program):
+
+class NotSymbolic(ValueError):
+    """Raised when a program's control flow or addressing depends on a symbol."""
+
+
+class Poly(object):
+    """Polynomial in noun and verb, as {(noun power, verb power): coefficient}."""
+
+    def __init__(self, terms):
+        self.terms = {k: v for k, v in terms.items() if v}
+
+    @classmethod
+    def symbol(cls, i):
+        return cls({(1, 0) if i == 0 else (0, 1): 1})
+
+    def __add__(self, other):
+        if isinstance(other, int):
+            other = Poly({(0, 0): other})
+        terms = dict(self.terms)
+        for k, v in other.terms.items():
+            terms[k] = terms.get(k, 0) + v
+        return Poly(terms)
+
+    __radd__ = __add__
+
+    def __mul__(self, other):
+        if isinstance(other, int):
+            other = Poly({(0, 0): other})
+        terms = {}
+        for (i, j), v in self.terms.items():
+            for (k, m), w in other.terms.items():
+                terms[(i + k, j + m)] = terms.get((i + k, j + m), 0) + v * w
+        return Poly(terms)
+
+    __rmul__ = __mul__
+
+    def __call__(self, noun, verb):
+        return sum(v * noun ** i * verb ** j for (i, j), v in self.terms.items())
+
+    def __repr__(self):
+        return ' + '.join(f'{v}*n^{i}*v^{j}' for (i, j), v in sorted(self.terms.items())) or '0'
+
+
+# result of reading through a symbolic address, which is fine as long as
+# it is overwritten before being used
+UNKNOWN = object()
+
+
+def _concrete(value):
+    if value is UNKNOWN or isinstance(value, Poly):
+        raise NotSymbolic('data dependent address or instruction')
+    return value
+
+
+def run_symbolic(program):
+    """Run program with noun and verb (addresses 1 and 2) as symbols.
+
+    Returns the final memory, in which any cell may be a Poly, or UNKNOWN
+    if it depends on a read from a symbolic address. Only the add, mul
+    and halt instructions are supported, and instructions and addresses
+    must be concrete, anything else raises NotSymbolic.
+    """
+    mem = list(program)
+    mem[1] = Poly.symbol(0)
+    mem[2] = Poly.symbol(1)
     pc = 0
-    while pc < len(program):
-        opcode = program[pc]
+    while True:
+        opcode, _, mode_a, mode_b, mode_c = decode_word(_concrete(mem[pc]))
         if opcode == 99:
-            break
-        elif opcode in (1, 2):
-            a, b, c = program[pc+1 : pc+4]
-            if opcode == 1:
-                program[c] = program[a] + program[b]
-            elif opcode == 2:
-                program[c] = program[a] * program[b]
+            return mem
+        if opcode not in (1, 2) or mode_c != 0:
+            raise NotSymbolic(f'unsupported instruction {mem[pc]} at {pc}')
+        args = []
+        for mode, operand in zip((mode_a, mode_b), mem[pc + 1:pc + 3]):
+            if mode == 1:
+                args.append(operand)
+            elif operand is UNKNOWN or isinstance(operand, Poly):
+                args.append(UNKNOWN)
+            else:
+                args.append(mem[operand])
+        x, y = args
+        if x is UNKNOWN or y is UNKNOWN:
+            value = UNKNOWN
         else:
-            raise ValueError('unexpected opcode')
+            value = x + y if opcode == 1 else x * y
+        mem[_concrete(mem[pc + 3])] = value
         pc += 4
-    return program
 
 
-def process(puzzle_input, verbose=False):
+def solve_symbolic(puzzle_input, target):
+    """Return the first (noun, verb) pair which outputs target, solving symbolically."""
+    out = run_symbolic(puzzle_input)[0]
+    if out is UNKNOWN:
+        raise NotSymbolic('output depends on a symbolic address')
+    if not isinstance(out, Poly):
+        return (0, 0) if out == target else None
+    for noun in range(100):
+        # collect the output as a polynomial in verb for this noun
+        coeffs = {}
+        for (i, j), v in out.terms.items():
+            coeffs[j] = coeffs.get(j, 0) + v * noun ** i
+        if max(coeffs, default=0) <= 1:
+            a = coeffs.get(1, 0)
+            rest = target - coeffs.get(0, 0)
+            if a == 0:
+                if rest == 0:
+                    return noun, 0
+            elif rest % a == 0 and 0 <= rest // a < 100:
+                return noun, rest // a
+            continue
+        for verb in range(100):
+            if out(noun, verb) == target:
+                return noun, verb
+    return None
+
+
+def run_intcode(program):
+    vm = IntcodeVM(program)
+    vm.run()
+    return vm.mem
+
+
+def find_inputs(puzzle_input, target, nouns):
+    """Return the first (noun, verb) pair for nouns which outputs target."""
+    nouns, verbs = np.meshgrid(nouns, np.arange(100), indexing='ij')
+    vm = run_batch(puzzle_input, patches={1: nouns.ravel(), 2: verbs.ravel()})
+    found = np.flatnonzero(vm.mem[:, 0] == target)
+    if len(found):
+        return int(nouns.flat[found[0]]), int(verbs.flat[found[0]])
+    return None
+
+
+def process(puzzle_input, verbose=False, workers=1):
     p1 = p2 = None
     prog = list(puzzle_input)
     prog[1] = 12
     prog[2] = 2
     p1 = run_intcode(prog)[0]
-    for i in tqdm(range(100)):
-        for j in range(100):
-            prog = list(puzzle_input)
-            prog[1] = i
-            prog[2] = j
-            if run_intcode(prog)[0] == 19690720:
-                p2 = 100 * i + j
-                break
-        if p2 is not None:
-            break
+    try:
+        found = solve_symbolic(puzzle_input, 19690720)
+    except NotSymbolic as e:
+        if verbose:
+            print(f'falling back to brute force: {e}')
+        noun_ranges = [range(i, i + 10) for i in range(0, 100, 10)]
+        found = parallel_search(partial(find_inputs, puzzle_input, 19690720), noun_ranges,
+                                match=lambda x: x is not None, workers=workers)
+        if found is not None:
+            found = found[1]
+    if found is not None:
+        noun, verb = found
+        p2 = 100 * noun + verb
     return p1, p2
 
 
@@ -52,10 +173,12 @@ def main():
     parser.add_argument('infile', help='input file to read ("-" for stdin)')
     parser.add_argument('-v', '--verbose', '-d', '--debug',
                         action='store_true', dest='verbose', help='verbose output')
+    parser.add_argument('-j', '--workers', type=int, default=1,
+                        help='number of worker processes (0 for one per CPU)')
     args = parser.parse_args()
     try:
         puzzle_input = [int(x) for x in ''.join(fileinput.input(args.infile)).split(',') if x.strip()]
-        p1, p2 = process(puzzle_input, verbose=args.verbose)
+        p1, p2 = process(puzzle_input, verbose=args.verbose, workers=args.workers or None)
         print(f'Part one: {p1}')
         print(f'Part two: {p2}')
     except KeyboardInterrupt:
@@ -2,99 +2,49 @@
 # -*- coding: utf-8 -*-
 """Advent of Code 2019 day 20 module."""
 
-import itertools
-from heapq import heappush, heappop
 from string import ascii_uppercase
 
+import gridsearch
 
-class PrioQueue(object):
 
-    REMOVED = (-1, -1, -1)
+def portal_graph(grid, portals):
+    """Return the walking distances between portal cells.
 
-    def __init__(self):
-        self.q = []
-        self.entries = {}
-        self._count = itertools.count()
+    Maps every portal cell to a list of (cell, steps) pairs for the other
+    portal cells reachable from it without taking a portal, so the search
+    only needs one BFS per portal instead of stepping through every cell.
+    """
+    walk = gridsearch.grid_neighbors(grid, walls='# ' + ascii_uppercase)
+    cells = {pos for v in portals.values() for pos in v}
+    graph = {}
+    for src in cells:
+        dist, _ = gridsearch.bfs(src, walk)
+        graph[src] = [(pos, dist[pos]) for pos in cells if pos != src and pos in dist]
+    return graph
 
-    def add(self, item, prio=0):
-        """Add or update priority q entry."""
-        if item in self.entries:
-            self.remove(item)
-        count = next(self._count)
-        entry = (prio, count, item)
-        self.entries[item] = entry
-        heappush(self.q, entry)
 
-    def remove(self, item):
-        entry = self.entries.pop(item)
-        entry[-1] = self.REMOVED
-
-    def pop(self):
-        while self.q:
-            prio, count, item = heappop(self.q)
-            if item is not self.REMOVED:
-                del self.entries[item]
-                return item
-        raise KeyError('pop from empty queue')
-
-    def empty(self):
-        return len(self.q) == 0
-
-
-def adjacent(pos):
-    x, y, z = pos
-    for point in [(x + 1, y, z), (x - 1, y, z), (x, y + 1, z), (x, y - 1, z)]:
-        yield point
-
-
-def neighbors(grid, portal_map, pos, recursive=False):
-    for point in adjacent(pos):
-        x, y, z = point
-        if y < 0 or x < 0 or y >= len(grid) or x >= len(grid[0]):
-            continue
-        c = grid[y][x]
-        if c == '.':
-            yield point
-    x, y, z = pos
+def neighbors(graph, portal_map, node, recursive=False, max_level=None):
+    x, y, z = node
+    for (px, py), steps in graph[(x, y)]:
+        yield (px, py, z), steps
     if (x, y) in portal_map:
         (x, y), change = portal_map[(x, y)]
         if recursive:
             z += change
-        if z >= 0:
-            yield (x, y, z)
-
-
-def dijkstra(grid, portal_map, src, dst=None, recursive=False):
-    dist = {}
-    prev = {}
-    q = PrioQueue()
-
-    max_dist = len(grid) * len(grid[0])
-    if recursive:
-        max_levels = len(portal_map) / 2
-        max_dist *= max_levels
-
-    visited = set()
-    q.add(src, max_dist)
-    dist[src] = 0
-
-    while not q.empty():
-        pos = q.pop()
-        if dst is not None and pos == dst:
-            break
-        visited.add(pos)
-        x, y, z = pos
-        for point in neighbors(grid, portal_map, pos, recursive):
-            if point in visited:
-                continue
-            px, py, pz = point
-            alt = dist[pos] + 1
-            if point not in dist or alt < dist[point]:
-                dist[point] = alt
-                prev[point] = pos
-                q.add(point, alt)
-
-    return dist, prev
+        if z >= 0 and (max_level is None or z <= max_level):
+            yield (x, y, z), 1
+
+
+def dijkstra(graph, portal_map, src, dst=None, recursive=False):
+    """Shortest paths between (x, y, level) portal cells.
+
+    In a shortest recursive path, the portals used to enter and leave each
+    level below the outermost are a different pair at every level (else the
+    deeper excursion could replace the shallower one), so it never has to go
+    deeper than the number of portal pairs squared.
+    """
+    max_level = (len(portal_map) // 2) ** 2 if recursive else None
+    return gridsearch.dijkstra(src, lambda node: neighbors(graph, portal_map, node, recursive, max_level), dst)
 
 
 def get_portals(grid):
@@ -138,12 +88,17 @@ def process(puzzle_input, verbose=False):
     portals, portal_map = get_portals(grid)
     start = portals['AA'][0] + (0,)
     end = portals['ZZ'][0] + (0,)
-    dist, prev = dijkstra(grid, portal_map, start, end)
+    graph = portal_graph(grid, portals)
+    dist, prev = dijkstra(graph, portal_map, start, end)
     if prev.get(end) is not None:
         p1 = dist[end]
-    dist, prev = dijkstra(grid, portal_map, start, end, True)
+    if verbose:
+        print(f'part one: {len(dist)} nodes reached')
+    dist, prev = dijkstra(graph, portal_map, start, end, True)
     if prev.get(end) is not None:
         p2 = dist[end]
+    if verbose:
+        print(f'part two: {len(dist)} nodes reached')
     return p1, p2
 
 
@@ -2,151 +2,123 @@
 # -*- coding: utf-8 -*-
 """Advent of Code 2019 day 23 module."""
 
-from collections import defaultdict
-from queue import Queue
-
-
-def get_params(mem, input_params, modes, base):
-    params = []
-    for i, param in enumerate(input_params):
-        if i >= len(modes):
-            mode = 0
-        else:
-            mode = modes[i]
-        if mode == 0:
-            params.append(mem[param])
-        elif mode == 1:
-            params.append(param)
-        elif mode == 2:
-            params.append(mem[param+base])
-        else:
-            raise ValueError(f'unexpected mode {mode}')
-    return params
-
-
-def run_intcode(program, input_q):
-    pc = 0
-    output = None
-    relative_base = 0
-    mem = defaultdict(int)
-    for i, data in enumerate(program):
-        mem[i] = data
-    waiting = 0
-    while pc in mem:
-        opcode = mem[pc] % 100
-        param_modes = [int(c) for c in str(mem[pc] // 100)]
-        param_modes.reverse()
-        if opcode == 99:
-            break
-        if opcode in (1, 2, 7, 8,):
-            a, b, c = (mem[pc+1], mem[pc+2], mem[pc+3])
-            params = get_params(mem, [a, b], param_modes, relative_base)
-            if len(param_modes) >= 3 and param_modes[2] == 2:
-                c += relative_base
-            if opcode == 1:
-                mem[c] = params[0] + params[1]
-            elif opcode == 2:
-                mem[c] = params[0] * params[1]
-            elif opcode == 7:
-                if params[0] < params[1]:
-                    mem[c] = 1
-                else:
-                    mem[c] = 0
-            elif opcode == 8:
-                if params[0] == params[1]:
-                    mem[c] = 1
-                else:
-                    mem[c] = 0
-            pc += 4
-        elif opcode in (3, 4, 9):
-            a = mem[pc+1]
-            if opcode == 3:
-                if param_modes and param_modes[0] == 2:
-                    a += relative_base
-                if input_q.empty():
-                    waiting += 1
-                    mem[a] = -1
-                    if waiting > 1:
-                        yield None
-                else:
-                    waiting = 0
-                    mem[a] = input_q.get()
-            else:
-                params = get_params(mem, [a], param_modes, relative_base)
-                if opcode == 4:
-                    waiting = 0
-                    output = params[0]
-                    yield output
-                elif opcode == 9:
-                    relative_base += params[0]
-            pc += 2
-        elif opcode in (5, 6):
-            a, b = (mem[pc+1], mem[pc+2])
-            params = get_params(mem, [a, b], param_modes, relative_base)
-            if (opcode == 5 and params[0] != 0) or (opcode == 6 and params[0] == 0):
-                pc = params[1]
-            else:
-                pc += 3
-        else:
-            raise ValueError(f'unexpected opcode {opcode}')
-    return output
-
-
-def run_network(puzzle_input, use_nat=False):
-    nics = []
-    in_queues = []
-    out_queues = []
-    for i in range(50):
-        q = Queue()
-        q.put(i)
-        gen = run_intcode(list(puzzle_input), q)
-        nics.append(gen)
-        in_queues.append(q)
-        out_queues.append([])
-
-    nat_packet = (None, None)
-    last_y = None
-
-    not_idle = list(range(50))
-
-    while True:
+import asyncio
+
+from intcode import HALTED, Channel, IntcodeVM
+
+
+class Network(object):
+    """Intcode NICs run as asyncio tasks, with an optional NAT.
+
+    A NIC is idle once its VM has read an empty queue twice with no I/O
+    in between. An idle NIC waits on its own event until a packet is
+    sent to it, so the NAT sees the whole network go idle exactly when
+    the last busy NIC does.
+    """
+
+    def __init__(self, puzzle_input, size=50, use_nat=False):
+        self.size = size
+        self.use_nat = use_nat
+        # boot once up to the address read, and fork every NIC from there
+        boot = IntcodeVM(puzzle_input, Channel(), jit=True)
+        boot.run()
+        self.in_queues = []
+        self.nics = []
+        for i in range(size):
+            vm = boot.fork(Channel())
+            vm.idle_input = -1
+            vm.input_q.put(i)
+            self.in_queues.append(vm.input_q)
+            self.nics.append(vm)
+        self.nat_packet = (None, None)
+        self.last_y = None
+
+    def send(self, dst, x, y):
+        if dst == 255:
+            self.nat_packet = (x, y)
+            if not self.use_nat and not self.done.done():
+                self.done.set_result(self.nat_packet)
+            return
+        if not 0 <= dst < self.size:
+            raise ValueError(f'packet sent to unknown address {dst}')
+        self.in_queues[dst].put(x)
+        self.in_queues[dst].put(y)
+        if self.idle[dst]:
+            self.idle[dst] = False
+            self.idle_count -= 1
+            self.wakeup[dst].set()
+
+    async def run_nic(self, i):
+        vm = self.nics[i]
+        packet = []
+        while True:
+            status, out = vm.run(3 - len(packet))
+            packet.extend(out)
+            if len(packet) == 3:
+                dst, x, y = packet
+                packet = []
+                self.send(dst, x, y)
+                if self.done.done():
+                    return
+                # let woken NICs run before sending more
+                await asyncio.sleep(0)
+                continue
+            if status == HALTED:
+                break
+            if not self.in_queues[i].empty():
+                continue
+            self.idle[i] = True
+            self.idle_count += 1
+            if self.idle_count == self.size:
+                self.all_idle.set()
+            await self.wakeup[i].wait()
+            self.wakeup[i].clear()
+        # a halted NIC never sends again
+        self.idle[i] = True
+        self.idle_count += 1
+        if self.idle_count == self.size:
+            self.all_idle.set()
+
+    async def run_nat(self):
+        while True:
+            await self.all_idle.wait()
+            self.all_idle.clear()
+            if not self.use_nat:
+                raise RuntimeError('network will idle forever')
+            x, y = self.nat_packet
+            if x is None or y is None:
+                raise RuntimeError('network will idle forever')
+            if y == self.last_y:
+                if not self.done.done():
+                    self.done.set_result(self.nat_packet)
+                return
+            self.last_y = y
+            self.nat_packet = (None, None)
+            self.send(0, x, y)
+
+    async def run(self):
+        self.done = asyncio.get_running_loop().create_future()
+        self.idle = [False] * self.size
+        self.idle_count = 0
+        self.wakeup = [asyncio.Event() for _ in range(self.size)]
+        self.all_idle = asyncio.Event()
+        tasks = [asyncio.create_task(self.run_nic(i)) for i in range(self.size)]
+        tasks.append(asyncio.create_task(self.run_nat()))
         try:
-            while not_idle:
-                i = not_idle.pop(0)
-                gen = nics[i]
-                while True:
-                    out = next(gen)
-                    if out is None:
-                        break
-                    out_queues[i].append(out)
-                    if len(out_queues[i]) == 3:
-                        dst, x, y = out_queues[i]
-                        # print(f'{i:02} -> {dst:02} ({x}, {y})')
-                        if dst == 255:
-                            nat_packet = (x, y)
-                            if not use_nat:
-                                return nat_packet
-                        else:
-                            in_queues[dst].put(x)
-                            in_queues[dst].put(y)
-                            if dst not in not_idle:
-                                not_idle.append(dst)
-                        out_queues[i].clear()
-            if use_nat:
-                x, y = nat_packet
-                if x is None or y is None:
-                    raise RuntimeError('network will idle forever')
-                # print(f'IDLE 255 -> 00 {nat_packet}')
-                if y == last_y:
-                    break
-                last_y = y
-                in_queues[0].put(x)
-                in_queues[0].put(y)
-                not_idle = list(range(50))
-                nat_packet = (None, None)
-        except StopIteration:
-            break
-    return nat_packet
+            pending = {self.done, *tasks}
+            while not self.done.done():
+                finished, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in finished:
+                    # re-raise a NIC or NAT failure instead of waiting forever
+                    task.result()
+            return self.done.result()
+        finally:
+            for task in tasks:
+                task.cancel()
+
+
+def run_network(puzzle_input, use_nat=False, size=50):
+    return asyncio.run(Network(puzzle_input, size, use_nat).run())
 
 
 def process(puzzle_input, verbose=False):
@@ -2,112 +2,19 @@
 # -*- coding: utf-8 -*-
 """Advent of Code 2019 day 25 module."""
 
-from collections import defaultdict
-from queue import Queue
-
-
-def get_params(mem, input_params, modes, base):
-    params = []
-    for i, param in enumerate(input_params):
-        if i >= len(modes):
-            mode = 0
-        else:
-            mode = modes[i]
-        if mode == 0:
-            params.append(mem[param])
-        elif mode == 1:
-            params.append(param)
-        elif mode == 2:
-            params.append(mem[param+base])
-        else:
-            raise ValueError(f'unexpected mode {mode}')
-    return params
-
-
-def run_intcode(program, input_f):
-    pc = 0
-    output = None
-    relative_base = 0
-    mem = defaultdict(int)
-    for i, data in enumerate(program):
-        mem[i] = data
-    while pc in mem:
-        opcode = mem[pc] % 100
-        param_modes = [int(c) for c in str(mem[pc] // 100)]
-        param_modes.reverse()
-        if opcode == 99:
-            break
-        if opcode in (1, 2, 7, 8,):
-            a, b, c = (mem[pc+1], mem[pc+2], mem[pc+3])
-            params = get_params(mem, [a, b], param_modes, relative_base)
-            if len(param_modes) >= 3 and param_modes[2] == 2:
-                c += relative_base
-            if opcode == 1:
-                mem[c] = params[0] + params[1]
-            elif opcode == 2:
-                mem[c] = params[0] * params[1]
-            elif opcode == 7:
-                if params[0] < params[1]:
-                    mem[c] = 1
-                else:
-                    mem[c] = 0
-            elif opcode == 8:
-                if params[0] == params[1]:
-                    mem[c] = 1
-                else:
-                    mem[c] = 0
-            pc += 4
-        elif opcode in (3, 4, 9):
-            a = mem[pc+1]
-            if opcode == 3:
-                if param_modes and param_modes[0] == 2:
-                    a += relative_base
-                mem[a] = input_f()
-            else:
-                params = get_params(mem, [a], param_modes, relative_base)
-                if opcode == 4:
-                    output = params[0]
-                    yield output
-                elif opcode == 9:
-                    relative_base += params[0]
-            pc += 2
-        elif opcode in (5, 6):
-            a, b = (mem[pc+1], mem[pc+2])
-            params = get_params(mem, [a, b], param_modes, relative_base)
-            if (opcode == 5 and params[0] != 0) or (opcode == 6 and params[0] == 0):
-                pc = params[1]
-            else:
-                pc += 3
-        else:
-            raise ValueError(f'unexpected opcode {opcode}')
-    return output
+from intcode import BLOCKED, Channel, IntcodeVM
 
 
 def run_droid(puzzle_input):
 
-    q = Queue()
-
-    def get_input():
-        nonlocal q
-        if q.empty():
-            s = input('> ')
-            for c in s:
-                q.put(ord(c))
-            q.put(ord('\n'))
-        return q.get()
-
-    gen = run_intcode(list(puzzle_input), get_input)
-    out = []
+    vm = IntcodeVM(list(puzzle_input), Channel())
     while True:
-        try:
-            c = chr(next(gen))
-            if c == '\n':
-                print(''.join(out))
-                out = []
-            else:
-                out.append(c)
-        except StopIteration:
+        status, out = vm.run()
+        print(''.join(map(chr, out)), end='')
+        if status != BLOCKED:
             break
+        s = input('> ')
+        vm.input_q.extend(f'{s}\n')
 
 
 def process(puzzle_input, verbose=False):
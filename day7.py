@@ -3,104 +3,81 @@
 """Advent of Code 2019 day 7 module."""
 
 from itertools import cycle, permutations
-from queue import Queue
-
-
-def get_params(program, input_params, modes):
-    params = []
-    for i, param in enumerate(input_params):
-        if i >= len(modes):
-            mode = 0
-        else:
-            mode = modes[i]
-        if mode == 0:
-            params.append(program[param])
-        elif mode == 1:
-            params.append(param)
-        else:
-            raise ValueError(f'unexpected mode {mode}')
-    return params
-
-
-def run_intcode(program, input_q):
-    pc = 0
-    output = None
-    while pc < len(program):
-        opcode = program[pc] % 100
-        param_modes = [int(c) for c in str(program[pc] // 100)]
-        param_modes.reverse()
-        if opcode == 99:
-            break
-        if opcode in (1, 2, 7, 8,):
-            a, b, c = program[pc+1 : pc+4]
-            params = get_params(program, [a, b], param_modes)
-            if opcode == 1:
-                program[c] = params[0] + params[1]
-            elif opcode == 2:
-                program[c] = params[0] * params[1]
-            elif opcode == 7:
-                if params[0] < params[1]:
-                    program[c] = 1
-                else:
-                    program[c] = 0
-            elif opcode == 8:
-                if params[0] == params[1]:
-                    program[c] = 1
-                else:
-                    program[c] = 0
-            pc += 4
-        elif opcode in (3, 4):
-            a = program[pc+1]
-            if opcode == 3:
-                if input_q.empty():
-                    raise ValueError('input instruction w/empty input queue')
-                program[a] = input_q.get()
-            elif opcode == 4:
-                params = get_params(program, [a], param_modes)
-                output = params[0]
-                yield output
-            pc += 2
-        elif opcode in (5, 6):
-            a, b = program[pc+1 : pc+3]
-            params = get_params(program, [a, b], param_modes)
-            if (opcode == 5 and params[0] != 0) or (opcode == 6 and params[0] == 0):
-                pc = params[1]
-            else:
-                pc += 3
-        else:
-            raise ValueError(f'unexpected opcode {opcode}')
-    return output
-
-
-def process(puzzle_input, verbose=False):
-    p1 = p2 = None
-    output_signals = []
-    for perm in permutations(range(5)):
-        output = 0
-        for i in perm:
-            q = Queue()
-            q.put(i)
-            q.put(output)
-            output = next(run_intcode(list(puzzle_input), q))
-        output_signals.append((perm, output))
-    p1 = sorted(output_signals, key=lambda x: x[1])[-1]
 
-    output_signals = []
-    for perm in permutations(range(5, 10)):
-        amps = []
+from intcode import BLOCKED, HALTED, Channel, IntcodeVM
+from parallel import parallel_search
+
+
+class Amplifiers(object):
+    """One amplifier program with its warm snapshots and remembered signals.
+
+    Caches are keyed by phase (and signal), so the program is only hashed
+    once per search. They are not pickled: a worker process sent an
+    instance starts with empty caches and fills its own.
+    """
+
+    def __init__(self, program):
+        self.program = list(program)
+        self.warm = {}
+        self.signals = {}
+
+    def __getstate__(self):
+        return self.program
+
+    def __setstate__(self, program):
+        self.__init__(program)
+
+    def warm_state(self, phase):
+        """Return a snapshot of an amplifier which has read its phase setting."""
+        if phase not in self.warm:
+            vm = IntcodeVM(self.program, Channel([phase]))
+            status, _ = vm.run()
+            if status != BLOCKED or vm.input_q:
+                raise ValueError(f'amplifier did not wait for a signal after phase {phase}')
+            self.warm[phase] = vm.snapshot()
+        return self.warm[phase]
+
+    def run_amplifier(self, phase, signal):
+        """Return the output of one amplifier in a linear chain.
+
+        An amplifier which halts after one signal is a pure function of
+        (phase, signal), so its result is remembered.
+        """
+        key = (phase, signal)
+        if key in self.signals:
+            return self.signals[key]
+        vm = IntcodeVM.from_snapshot(self.warm_state(phase), Channel([signal]))
+        status, out = vm.run()
+        if status == HALTED:
+            self.signals[key] = out[0]
+        return out[0]
+
+    def run_chain(self, perm):
+        output = 0
         for i in perm:
-            q = Queue()
-            q.put(i)
-            amps.append((run_intcode(list(puzzle_input), q), q))
+            output = self.run_amplifier(i, output)
+        return output
 
+    def run_feedback(self, perm):
+        amps = [IntcodeVM.from_snapshot(self.warm_state(i)) for i in perm]
         output = 0
-        for gen, q in cycle(amps):
-            try:
-                q.put(output)
-                output = next(gen)
-            except StopIteration:
+        for vm in cycle(amps):
+            vm.input_q.put(output)
+            status, out = vm.run(1)
+            if not out:
                 break
-        output_signals.append((perm, output))
+            output = out[0]
+        return output
+
+
+def process(puzzle_input, verbose=False, workers=1):
+    p1 = p2 = None
+    amps = Amplifiers(puzzle_input)
+    # 120 permutations, in chunks so each worker warms its caches only a few times
+    output_signals = parallel_search(amps.run_chain, permutations(range(5)), workers=workers, chunksize=8)
+    p1 = sorted(output_signals, key=lambda x: x[1])[-1]
+
+    output_signals = parallel_search(amps.run_feedback, permutations(range(5, 10)), workers=workers, chunksize=8)
     p2 = sorted(output_signals, key=lambda x: x[1])[-1]
     return p1, p2
 
@@ -114,10 +91,12 @@ def main():
     parser.add_argument('infile', help='input file to read ("-" for stdin)')
     parser.add_argument('-v', '--verbose', '-d', '--debug',
                         action='store_true', dest='verbose', help='verbose output')
+    parser.add_argument('-j', '--workers', type=int, default=1,
+                        help='number of worker processes (0 for one per CPU)')
     args = parser.parse_args()
     try:
         puzzle_input = [int(x) for x in ''.join(fileinput.input(args.infile)).split(',') if x.strip()]
-        p1, p2 = process(puzzle_input, verbose=args.verbose)
+        p1, p2 = process(puzzle_input, verbose=args.verbose, workers=args.workers or None)
         print(f'Part one: {p1}')
         print(f'Part two: {p2}')
     except KeyboardInterrupt:
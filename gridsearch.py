@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Shortest path searches shared by the maze days."""
+
+from collections import deque
+from heapq import heappush, heappop
+
+
+def grid_neighbors(grid, walls='#'):
+    """Return a neighbors function for (x, y) cells of a list of rows.
+
+    Cells outside the grid and cells whose character is in walls are not
+    passable.
+    """
+    height = len(grid)
+
+    def neighbors(pos):
+        x, y = pos
+        for nx, ny in ((x + 1, y), (x - 1, y), (x, y + 1), (x, y - 1)):
+            if 0 <= ny < height and 0 <= nx < len(grid[ny]) and grid[ny][nx] not in walls:
+                yield nx, ny
+
+    return neighbors
+
+
+def multi_source_bfs(sources, neighbors, dst=None):
+    """Breadth first search from every node in sources at once.
+
+    neighbors(node) yields the nodes one step away. Returns dist and prev
+    dicts covering every node reached (stopping early once dst is reached),
+    where prev of a source is None.
+    """
+    dist = {}
+    prev = {}
+    queue = deque()
+    for src in sources:
+        if src not in dist:
+            dist[src] = 0
+            prev[src] = None
+            queue.append(src)
+    while queue:
+        node = queue.popleft()
+        if node == dst:
+            break
+        d = dist[node] + 1
+        for point in neighbors(node):
+            if point not in dist:
+                dist[point] = d
+                prev[point] = node
+                queue.append(point)
+    return dist, prev
+
+
+def bfs(src, neighbors, dst=None):
+    """Unit weight shortest paths from src, see multi_source_bfs."""
+    return multi_source_bfs([src], neighbors, dst)
+
+
+def dijkstra(src, neighbors, dst=None):
+    """Weighted shortest paths from src.
+
+    neighbors(node) yields (node, cost) pairs with non-negative costs.
+    Returns dist and prev dicts like bfs, where dist is final for every
+    node which was popped before stopping at dst.
+    """
+    dist = {src: 0}
+    prev = {src: None}
+    done = set()
+    # a plain heapq with stale entries skipped when popped, rather than
+    # decrease-key, which is slower in pure Python
+    heap = [(0, 0, src)]
+    count = 1
+    while heap:
+        d, _, node = heappop(heap)
+        if node in done:
+            continue
+        if node == dst:
+            break
+        done.add(node)
+        for point, cost in neighbors(node):
+            alt = d + cost
+            if point not in dist or alt < dist[point]:
+                dist[point] = alt
+                prev[point] = node
+                # nodes are not required to be comparable, so ties are
+                # broken by insertion order
+                heappush(heap, (alt, count, point))
+                count += 1
+    return dist, prev
+
+
+def reconstruct_path(prev, dst):
+    """Return the nodes from the search source to dst, or None if dst was not reached."""
+    if dst not in prev:
+        return None
+    path = []
+    node = dst
+    while node is not None:
+        path.append(node)
+        node = prev[node]
+    path.reverse()
+    return path
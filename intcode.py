@@ -0,0 +1,876 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Shared Intcode engine."""
+
+import sys
+from array import array
+from bisect import bisect_right
+from collections import deque, namedtuple
+from time import perf_counter
+
+
+OPCODE_SIZES = {
+    1: 4,
+    2: 4,
+    3: 2,
+    4: 2,
+    5: 3,
+    6: 3,
+    7: 4,
+    8: 4,
+    9: 2,
+    99: 1,
+}
+
+MNEMONICS = {
+    1: 'add',
+    2: 'mul',
+    3: 'in',
+    4: 'out',
+    5: 'jt',
+    6: 'jf',
+    7: 'lt',
+    8: 'eq',
+    9: 'arb',
+    99: 'hlt',
+}
+
+Instruction = namedtuple('Instruction', ['opcode', 'size', 'a', 'b', 'c', 'mode_a', 'mode_b', 'mode_c'])
+
+Snapshot = namedtuple('Snapshot', ['mem', 'code', 'cache', 'jit', 'pc', 'relative_base', 'output', 'halted'])
+
+# longest run of instructions compiled into a single block
+JIT_MAX_BLOCK = 64
+
+# IntcodeVM.run() exit statuses
+HALTED = 1
+BLOCKED = 2
+OUTPUT = 3
+IDLE = 4
+
+
+class Channel(deque):
+    """Single threaded FIFO used for VM I/O.
+
+    Supports the put/get/empty subset of queue.Queue used by the VM, without
+    Queue's locking, plus bulk transfer of whole strings and buffers.
+    """
+
+    put = deque.append
+    get = deque.popleft
+
+    def empty(self):
+        return not self
+
+    def extend(self, values):
+        """Append values, which may be a str (as character codes) or bytes."""
+        if isinstance(values, str):
+            values = map(ord, values)
+        deque.extend(self, values)
+
+    def drain(self):
+        """Remove and return everything in the channel."""
+        values = list(self)
+        self.clear()
+        return values
+
+
+class InputBlocked(ValueError):
+    """Raised when a VM reads from an empty input queue.
+
+    The VM is left at the input instruction and can be resumed once more
+    input is available.
+    """
+
+
+def make_memory(program, memory='list'):
+    """Return a growable memory buffer holding a copy of program.
+
+    'list' memory holds arbitrary Python ints. 'array' memory is a more
+    compact array('q'), which the VM swaps for a list if a value ever
+    overflows 64 bits.
+    """
+    if memory == 'list':
+        return list(program)
+    if memory == 'array':
+        try:
+            return array('q', program)
+        except OverflowError:
+            return list(program)
+    raise ValueError(f'unexpected memory type {memory}')
+
+
+_formats = {}
+
+
+def decode_word(word):
+    """Return (opcode, size, mode_a, mode_b, mode_c) for an instruction word."""
+    fmt = _formats.get(word)
+    if fmt is None:
+        key = word
+        opcode = word % 100
+        if opcode not in OPCODE_SIZES:
+            raise ValueError(f'unexpected opcode {opcode}')
+        size = OPCODE_SIZES[opcode]
+        modes = [0, 0, 0]
+        word //= 100
+        for i in range(size - 1):
+            mode = word % 10
+            if mode not in (0, 1, 2):
+                raise ValueError(f'unexpected mode {mode}')
+            modes[i] = mode
+            word //= 10
+        fmt = _formats[key] = (opcode, size, *modes)
+    return fmt
+
+
+def decode(mem, pc):
+    """Decode the instruction at pc into an Instruction record."""
+    opcode, size, mode_a, mode_b, mode_c = decode_word(mem[pc])
+    operands = list(mem[pc + 1:pc + size])
+    operands.extend([0] * (3 - len(operands)))
+    return Instruction(opcode, size, *operands, mode_a, mode_b, mode_c)
+
+
+def format_instruction(ins):
+    """Return assembler-style text for an Instruction."""
+    args = []
+    for value, mode in list(zip(ins[2:5], ins[5:8]))[:ins.size - 1]:
+        if mode == 0:
+            args.append(f'[{value}]')
+        elif mode == 1:
+            args.append(str(value))
+        else:
+            args.append(f'[rb{value:+d}]')
+    return ' '.join([MNEMONICS[ins.opcode]] + args)
+
+
+def _operand(mode, value):
+    if mode == 0:
+        return f'mem[{value}]'
+    if mode == 1:
+        return str(value)
+    return f'mem[rb + {value}]'
+
+
+def compile_block(mem, cache, start, decode_f=decode, skip=()):
+    """Translate the straight-line code at start into a Python function.
+
+    The block runs until a jump, an I/O or halt instruction, an address
+    in skip or JIT_MAX_BLOCK instructions. The returned function is called
+    as fn(mem, rb, code, inv) and returns the next (pc, rb). Any store to
+    an address with a non-zero count in code calls inv(addr) and leaves
+    the block. Returns None if no instruction at start can be compiled.
+    """
+    body = []
+    pcs = []
+    starts = []
+    pc = start
+    jump = None
+    while len(pcs) < JIT_MAX_BLOCK and pc not in skip and 0 <= pc < len(mem):
+        ins = cache.get(pc)
+        if ins is None:
+            try:
+                ins = decode_f(pc)
+            except ValueError:
+                break
+        opcode, size, a, b, c, mode_a, mode_b, mode_c = ins
+        if opcode in (3, 4, 99):
+            break
+        pcs.append(pc)
+        starts.append(len(body))
+        next_pc = pc + size
+        x = _operand(mode_a, a)
+        y = _operand(mode_b, b)
+        if opcode in (1, 2, 7, 8):
+            if opcode == 1:
+                value = f'{x} + {y}'
+            elif opcode == 2:
+                value = f'{x} * {y}'
+            elif opcode == 7:
+                value = f'1 if {x} < {y} else 0'
+            else:
+                value = f'1 if {x} == {y} else 0'
+            if mode_c == 2:
+                body.append(f'c = rb + {c}; mem[c] = {value}')
+                body.append(f'if code[c]: inv(c); return {next_pc}, rb')
+            else:
+                body.append(f'mem[{c}] = {value}')
+                body.append(f'if code[{c}]: inv({c}); return {next_pc}, rb')
+        elif opcode == 9:
+            body.append(f'rb += {x}')
+        else:
+            jump = (x if opcode == 5 else f'not {x}', mode_b, y)
+        pc = next_pc
+        if jump is not None:
+            break
+    if not pcs:
+        return None
+    if jump is None:
+        body.append(f'return {pc}, rb')
+        lines = ['def block(mem, rb, code, inv):'] + ['    ' + line for line in body]
+        offset = 2
+    else:
+        test, mode, target = jump
+        if mode == 1 and int(target) == start:
+            # a block which jumps back to its own start is a loop
+            body.append(f'if {test}: continue')
+            body.append(f'return {pc}, rb')
+            lines = ['def block(mem, rb, code, inv):', '    while True:'] + ['        ' + line for line in body]
+            offset = 3
+        else:
+            body.append(f'if {test}: return {target}, rb')
+            body.append(f'return {pc}, rb')
+            lines = ['def block(mem, rb, code, inv):'] + ['    ' + line for line in body]
+            offset = 2
+    starts = [i + offset for i in starts]
+    namespace = {}
+    exec(compile('\n'.join(lines), f'<intcode block {start}>', 'exec'), namespace)
+    fn = namespace['block']
+    fn.pcs = pcs
+    fn.lines = starts
+    fn.end = pc
+    return fn
+
+
+def block_fault(fn, exc):
+    """Return the (pc, rb) of the instruction which raised exc inside fn.
+
+    Every compiled instruction performs its single store last, so the
+    faulting instruction has not changed memory and can be retried.
+    """
+    tb = exc.__traceback__
+    while tb is not None and tb.tb_frame.f_code is not fn.__code__:
+        tb = tb.tb_next
+    if tb is None:
+        return None
+    i = bisect_right(fn.lines, tb.tb_lineno) - 1
+    return fn.pcs[i], tb.tb_frame.f_locals['rb']
+
+
+class _JitState(object):
+    """Compiled blocks for one VM memory image."""
+
+    def __init__(self):
+        # compiled block (or False if uncompilable) keyed by start pc, the
+        # start pcs of the blocks covering each address, and instruction
+        # pcs which were modified after being compiled
+        self.blocks = {}
+        self.block_map = {}
+        self.skip = set()
+
+    def copy(self):
+        jit = _JitState()
+        jit.blocks = dict(self.blocks)
+        jit.block_map = dict(self.block_map)
+        jit.skip = set(self.skip)
+        return jit
+
+    def add(self, start, fn):
+        self.blocks[start] = fn
+        if fn:
+            for addr in range(start, fn.end):
+                self.block_map[addr] = self.block_map.get(addr, ()) + (start,)
+
+    def invalidate(self, addr):
+        """Drop blocks covering addr, and never compile its instruction again."""
+        for start in self.block_map.get(addr, ()):
+            fn = self.blocks.pop(start)
+            for pc in reversed(fn.pcs):
+                if pc <= addr:
+                    self.skip.add(pc)
+                    break
+            for i in range(start, fn.end):
+                starts = tuple(s for s in self.block_map[i] if s != start)
+                if starts:
+                    self.block_map[i] = starts
+                else:
+                    del self.block_map[i]
+
+
+class Profile(object):
+    """Instruction counts gathered by a VM running with profile=Profile().
+
+    Counts per opcode and per instruction address, and the time spent
+    inside IntcodeVM.run(). One profile can be shared by several VMs.
+    """
+
+    def __init__(self):
+        self.opcodes = [0] * 100
+        self.hits = {}
+        self.elapsed = 0.0
+
+    @property
+    def retired(self):
+        """Total number of instructions executed."""
+        return sum(self.opcodes)
+
+    @property
+    def ips(self):
+        """Instructions executed per second."""
+        return self.retired / self.elapsed if self.elapsed else 0.0
+
+    def hot(self, n=20):
+        """Return the n most executed (pc, count) pairs."""
+        return sorted(self.hits.items(), key=lambda item: (-item[1], item[0]))[:n]
+
+    def report(self, n=20, mem=None):
+        """Return a text report of opcode counts and the n hottest addresses.
+
+        If mem is given, each hot address is shown with its instruction.
+        """
+        retired = self.retired
+        lines = [f'{retired} instructions in {self.elapsed:.3f}s ({self.ips:.0f}/s)', '']
+        for opcode, count in enumerate(self.opcodes):
+            if count:
+                lines.append(f'{MNEMONICS[opcode]:>4} {count:12} {100 * count / retired:6.2f}%')
+        lines.append('')
+        for pc, count in self.hot(n):
+            line = f'{pc:6} {count:12} {100 * count / retired:6.2f}%'
+            if mem is not None:
+                try:
+                    line = f'{line}  {format_instruction(decode(mem, pc))}'
+                except (ValueError, IndexError):
+                    pass
+            lines.append(line)
+        return '\n'.join(lines)
+
+
+class Tracer(object):
+    """Ring buffer of the last size instructions run by a VM with trace=Tracer().
+
+    Each entry holds the instruction's pc, the relative base after it ran,
+    its decoded Instruction and the value it produced (the value stored,
+    output or added to the relative base, or the next pc of a jump). The
+    buffer is preallocated, so tracing allocates nothing per instruction.
+    """
+
+    def __init__(self, size=4096, dump_on_error=True, file=None):
+        self.size = size
+        self.pcs = array('q', bytes(8 * size))
+        self.rbs = array('q', bytes(8 * size))
+        self.ins = [None] * size
+        self.values = [0] * size
+        self.pos = 0
+        self.count = 0
+        self.dump_on_error = dump_on_error
+        self.file = file
+
+    def __len__(self):
+        return min(self.count, self.size)
+
+    def entries(self):
+        """Yield the buffered (pc, relative_base, instruction, value) entries, oldest first."""
+        n = len(self)
+        for i in range(self.pos - n, self.pos):
+            yield self.pcs[i], self.rbs[i], self.ins[i], self.values[i]
+
+    def dump(self, n=None, file=None):
+        """Print the last n (default all buffered) instructions."""
+        file = file or self.file or sys.stderr
+        entries = list(self.entries())
+        if n is not None:
+            entries = entries[-n:]
+        print(f'last {len(entries)} of {self.count} instructions:', file=file)
+        for pc, rb, ins, value in entries:
+            print(f'{pc:8} rb={rb:<6} {format_instruction(ins):32} -> {value}', file=file)
+
+
+class IntcodeVM(object):
+
+    def __init__(self, program, input_q=None, input_f=None, idle_input=None, memory='list', jit=False,
+                 profile=None, trace=None):
+        self.mem = make_memory(program, memory)
+        self.pc = 0
+        self.relative_base = 0
+        if input_q is None and input_f is None:
+            input_q = Channel()
+        self.input_q = input_q
+        self.input_f = input_f
+        self.idle_input = idle_input
+        self.output = None
+        self.halted = False
+        # decoded instructions keyed by pc, and the number of cached
+        # instructions covering each address
+        self._cache = {}
+        self._code = bytearray(len(self.mem))
+        self._jit = _JitState() if jit else None
+        if jit and program:
+            # leave instructions which the program is known to overwrite
+            # to the interpreter rather than compiling them over and over
+            from intcode_analysis import analyze
+            self._jit.skip.update(analyze(self.mem).modified)
+        self.profile = profile
+        self.trace = trace
+        # set while mem, _code and _cache are shared with a snapshot, and
+        # the snapshot state this VM last copied its own from
+        self._shared = False
+        self._origin = None
+
+    @classmethod
+    def from_snapshot(cls, snapshot, input_q=None, input_f=None, idle_input=None, profile=None, trace=None):
+        vm = cls([], input_q=input_q, input_f=input_f, idle_input=idle_input, jit=snapshot.jit is not None,
+                 profile=profile, trace=trace)
+        vm.restore(snapshot)
+        return vm
+
+    def snapshot(self):
+        """Return the current VM state.
+
+        Memory and the decoded instruction cache are shared rather than
+        copied. Any VM running on shared state copies it before it next
+        executes an instruction, so a snapshot is unaffected by later runs.
+        """
+        self._shared = True
+        return Snapshot(self.mem, self._code, self._cache, self._jit, self.pc, self.relative_base, self.output,
+                        self.halted)
+
+    def restore(self, snapshot):
+        """Reset the VM to a previously taken snapshot."""
+        (self.mem, self._code, self._cache, self._jit, self.pc, self.relative_base, self.output,
+         self.halted) = snapshot
+        self._shared = True
+
+    def fork(self, input_q=None, input_f=None):
+        """Return a new VM resuming from the current state.
+
+        Unless a new input queue is given, the fork gets a copy of any
+        pending input. A traced VM's fork is not traced.
+        """
+        if input_q is None and input_f is None:
+            input_f = self.input_f
+            if self.input_q is not None:
+                input_q = Channel(self.input_q)
+        return self.from_snapshot(self.snapshot(), input_q=input_q, input_f=input_f, idle_input=self.idle_input,
+                                  profile=self.profile)
+
+    def _unshare(self):
+        self._origin = (self.mem, self._code, self._cache, self._jit)
+        self.mem = self.mem[:]
+        self._code = bytearray(self._code)
+        self._cache = dict(self._cache)
+        if self._jit is not None:
+            self._jit = self._jit.copy()
+        self._shared = False
+
+    def _decode(self, pc):
+        ins = decode(self.mem, pc)
+        self._cache[pc] = ins
+        if pc + ins.size > len(self.mem):
+            self._grow(pc + ins.size)
+        code = self._code
+        for addr in range(pc, pc + ins.size):
+            code[addr] += 1
+        if self._origin is not None:
+            # snapshots are never executed directly, so an instruction which
+            # is unchanged since the snapshot can be shared with later forks
+            mem, code, cache, _ = self._origin
+            if pc not in cache and mem[pc:pc + ins.size] == self.mem[pc:pc + ins.size]:
+                cache[pc] = ins
+                for addr in range(pc, pc + ins.size):
+                    code[addr] += 1
+        return ins
+
+    def _invalidate(self, addr):
+        """Drop cached instructions which cover a written address."""
+        code = self._code
+        for pc in range(max(addr - 3, 0), addr + 1):
+            ins = self._cache.get(pc)
+            if ins is not None and pc + ins.size > addr:
+                del self._cache[pc]
+                for i in range(pc, pc + ins.size):
+                    code[i] -= 1
+        if self._jit is not None:
+            self._jit.invalidate(addr)
+
+    def _compile(self, pc):
+        jit = self._jit
+        fn = compile_block(self.mem, self._cache, pc, self._decode, jit.skip)
+        jit.add(pc, fn or False)
+        if fn and self._origin is not None:
+            # share the block with later forks of the snapshot, as long as
+            # the snapshot has the same code
+            mem, _, cache, origin_jit = self._origin
+            if (origin_jit is not None and pc not in origin_jit.blocks and all(p in cache for p in fn.pcs)
+                    and mem[pc:fn.end] == self.mem[pc:fn.end]):
+                origin_jit.add(pc, fn)
+        return fn
+
+    def _grow(self, size):
+        n = size - len(self.mem)
+        if n > 0:
+            if isinstance(self.mem, array):
+                # zeroed bytes avoid building a temporary list of n ints
+                self.mem.frombytes(bytes(8 * n))
+            else:
+                self.mem.extend([0] * n)
+            self._code.extend(bytes(n))
+
+    def _grow_for(self, pc, rb):
+        """Grow memory to cover every address used by the instruction at pc."""
+        ins = self._cache.get(pc)
+        if ins is None:
+            ins = decode(self.mem, pc)
+        addrs = []
+        for i, (operand, mode) in enumerate(zip(ins[2:5], ins[5:8])):
+            if i < ins.size - 1 and mode != 1:
+                addrs.append(operand + rb if mode == 2 else operand)
+        if not addrs or max(addrs) < len(self.mem):
+            return False
+        if min(addrs) < 0:
+            raise ValueError(f'negative address {min(addrs)}')
+        self._grow(max(max(addrs) + 1, 2 * len(self.mem)))
+        return True
+
+    def _widen(self):
+        """Replace array memory with a list once a value overflows 64 bits."""
+        if isinstance(self.mem, list):
+            return False
+        self.mem = list(self.mem)
+        return True
+
+    def run(self, max_outputs=None):
+        """Run until the VM halts, blocks on input or has max_outputs outputs.
+
+        Returns (status, outputs), where status is HALTED, BLOCKED, OUTPUT
+        (max_outputs reached) or IDLE, and outputs is the list of values
+        output during this call. A BLOCKED VM is left at its input
+        instruction and can be run again once more input is available.
+
+        If the VM was created with idle_input, empty input reads store
+        idle_input instead of blocking, and the run stops with IDLE once
+        the program has read idle_input twice without any I/O in between.
+        """
+        if self.halted:
+            return HALTED, []
+        if self.profile is not None or self.trace is not None:
+            try:
+                return self._run_instrumented(max_outputs)
+            except (Exception, KeyboardInterrupt):
+                if self.trace is not None and self.trace.dump_on_error:
+                    self.trace.dump()
+                raise
+        input_q = self.input_q
+        input_f = self.input_f
+        idle_input = self.idle_input
+        pc = self.pc
+        rb = self.relative_base
+        out = []
+        waiting = 0
+        status = HALTED
+        while True:
+            # memory is replaced on overflow or when unsharing a snapshot,
+            # so re-fetch it on every (re)entry to the dispatch loop
+            if self._shared:
+                self._unshare()
+            mem = self.mem
+            code = self._code
+            cache = self._cache
+            blocks = self._jit.blocks if self._jit is not None else None
+            try:
+                while True:
+                    if blocks is not None:
+                        fn = blocks.get(pc)
+                        if fn is None:
+                            fn = self._compile(pc)
+                        if fn:
+                            try:
+                                pc, rb = fn(mem, rb, code, self._invalidate)
+                            except (IndexError, OverflowError) as e:
+                                fault = block_fault(fn, e)
+                                if fault is not None:
+                                    pc, rb = fault
+                                raise
+                            continue
+                    ins = cache.get(pc)
+                    if ins is None:
+                        if not 0 <= pc < len(mem):
+                            break
+                        ins = self._decode(pc)
+                    opcode, size, a, b, c, mode_a, mode_b, mode_c = ins
+                    if opcode == 99:
+                        break
+                    if opcode == 3:
+                        if mode_a == 2:
+                            a += rb
+                        if a >= len(mem):
+                            self._grow(max(a + 1, 2 * len(mem)))
+                        if input_f is not None:
+                            value = input_f()
+                        elif not input_q.empty():
+                            waiting = 0
+                            value = input_q.get()
+                        elif idle_input is not None:
+                            waiting += 1
+                            value = idle_input
+                        else:
+                            status = BLOCKED
+                            break
+                        try:
+                            mem[a] = value
+                        except OverflowError:
+                            self._widen()
+                            mem = self.mem
+                            mem[a] = value
+                        if code[a]:
+                            self._invalidate(a)
+                        pc += 2
+                        if waiting > 1:
+                            status = IDLE
+                            break
+                        continue
+                    if mode_a == 0:
+                        x = mem[a]
+                    elif mode_a == 1:
+                        x = a
+                    else:
+                        x = mem[a + rb]
+                    if opcode in (1, 2, 7, 8):
+                        if mode_b == 0:
+                            y = mem[b]
+                        elif mode_b == 1:
+                            y = b
+                        else:
+                            y = mem[b + rb]
+                        if mode_c == 2:
+                            c += rb
+                        if opcode == 1:
+                            mem[c] = x + y
+                        elif opcode == 2:
+                            mem[c] = x * y
+                        elif opcode == 7:
+                            mem[c] = 1 if x < y else 0
+                        else:
+                            mem[c] = 1 if x == y else 0
+                        if code[c]:
+                            self._invalidate(c)
+                        pc += 4
+                    elif opcode in (5, 6):
+                        if (opcode == 5 and x != 0) or (opcode == 6 and x == 0):
+                            if mode_b == 0:
+                                pc = mem[b]
+                            elif mode_b == 1:
+                                pc = b
+                            else:
+                                pc = mem[b + rb]
+                        else:
+                            pc += 3
+                    elif opcode == 4:
+                        waiting = 0
+                        out.append(x)
+                        pc += 2
+                        if len(out) == max_outputs:
+                            status = OUTPUT
+                            break
+                    else:
+                        rb += x
+                        pc += 2
+            except IndexError:
+                # the faulting instruction has no side effects yet, so it
+                # can simply be retried once memory covers its addresses
+                if not self._grow_for(pc, rb):
+                    raise
+                continue
+            except OverflowError:
+                if not self._widen():
+                    raise
+                continue
+            break
+        self.pc = pc
+        self.relative_base = rb
+        if out:
+            self.output = out[-1]
+        if status == HALTED:
+            self.halted = True
+        return status, out
+
+    def _run_instrumented(self, max_outputs=None):
+        """run() without compiled blocks, feeding the profile and tracer.
+
+        Kept apart from run() so that VMs without instrumentation pay
+        nothing for it.
+        """
+        profile = self.profile
+        trace = self.trace
+        if profile is not None:
+            opcodes = profile.opcodes
+            hits = profile.hits
+            started = perf_counter()
+        if trace is not None:
+            trace_pc = trace.pcs
+            trace_rb = trace.rbs
+            trace_ins = trace.ins
+            trace_value = trace.values
+            trace_size = trace.size
+            t = trace.pos
+        traced = 0
+        input_q = self.input_q
+        input_f = self.input_f
+        idle_input = self.idle_input
+        pc = self.pc
+        rb = self.relative_base
+        out = []
+        waiting = 0
+        status = HALTED
+        try:
+            while True:
+                if self._shared:
+                    self._unshare()
+                mem = self.mem
+                code = self._code
+                cache = self._cache
+                try:
+                    while True:
+                        ins = cache.get(pc)
+                        if ins is None:
+                            if not 0 <= pc < len(mem):
+                                break
+                            ins = self._decode(pc)
+                        opcode, size, a, b, c, mode_a, mode_b, mode_c = ins
+                        if opcode == 99:
+                            break
+                        if opcode == 3:
+                            if mode_a == 2:
+                                a += rb
+                            if a >= len(mem):
+                                self._grow(max(a + 1, 2 * len(mem)))
+                            if input_f is not None:
+                                value = input_f()
+                            elif not input_q.empty():
+                                waiting = 0
+                                value = input_q.get()
+                            elif idle_input is not None:
+                                waiting += 1
+                                value = idle_input
+                            else:
+                                status = BLOCKED
+                                break
+                            try:
+                                mem[a] = value
+                            except OverflowError:
+                                self._widen()
+                                mem = self.mem
+                                mem[a] = value
+                            if code[a]:
+                                self._invalidate(a)
+                            next_pc = pc + 2
+                        else:
+                            if mode_a == 0:
+                                x = mem[a]
+                            elif mode_a == 1:
+                                x = a
+                            else:
+                                x = mem[a + rb]
+                            if opcode in (1, 2, 7, 8):
+                                if mode_b == 0:
+                                    y = mem[b]
+                                elif mode_b == 1:
+                                    y = b
+                                else:
+                                    y = mem[b + rb]
+                                if mode_c == 2:
+                                    c += rb
+                                if opcode == 1:
+                                    value = x + y
+                                elif opcode == 2:
+                                    value = x * y
+                                elif opcode == 7:
+                                    value = 1 if x < y else 0
+                                else:
+                                    value = 1 if x == y else 0
+                                mem[c] = value
+                                if code[c]:
+                                    self._invalidate(c)
+                                next_pc = pc + 4
+                            elif opcode in (5, 6):
+                                if (opcode == 5 and x != 0) or (opcode == 6 and x == 0):
+                                    if mode_b == 0:
+                                        next_pc = mem[b]
+                                    elif mode_b == 1:
+                                        next_pc = b
+                                    else:
+                                        next_pc = mem[b + rb]
+                                else:
+                                    next_pc = pc + 3
+                                value = next_pc
+                            elif opcode == 4:
+                                waiting = 0
+                                out.append(x)
+                                value = x
+                                next_pc = pc + 2
+                            else:
+                                rb += x
+                                value = x
+                                next_pc = pc + 2
+                        # only instructions which completed are recorded
+                        if profile is not None:
+                            opcodes[opcode] += 1
+                            hits[pc] = hits.get(pc, 0) + 1
+                        if trace is not None:
+                            trace_pc[t] = pc
+                            trace_rb[t] = rb
+                            trace_ins[t] = ins
+                            trace_value[t] = value
+                            t += 1
+                            if t == trace_size:
+                                t = 0
+                            traced += 1
+                        pc = next_pc
+                        if opcode == 4:
+                            if len(out) == max_outputs:
+                                status = OUTPUT
+                                break
+                        elif waiting > 1:
+                            status = IDLE
+                            break
+                except IndexError:
+                    if not self._grow_for(pc, rb):
+                        raise
+                    continue
+                except OverflowError:
+                    if not self._widen():
+                        raise
+                    continue
+                break
+        finally:
+            if profile is not None:
+                profile.elapsed += perf_counter() - started
+            if trace is not None:
+                trace.pos = t
+                trace.count += traced
+        self.pc = pc
+        self.relative_base = rb
+        if out:
+            self.output = out[-1]
+        if status == HALTED:
+            self.halted = True
+        return status, out
+
+    def outputs(self):
+        """Run the program, yielding each output value.
+
+        Raises InputBlocked on an empty input queue, and yields None when
+        the VM goes idle (see run()).
+        """
+        while True:
+            status, out = self.run(1)
+            yield from out
+            if status == HALTED:
+                return self.output
+            if status == BLOCKED:
+                raise InputBlocked('input instruction w/empty input queue')
+            if status == IDLE:
+                yield None
+
+
+def run_intcode(program, input_q=None, input_f=None, idle_input=None, memory='list', jit=False, profile=None,
+                trace=None):
+    """Return a generator which runs program and yields its outputs.
+
+    Pass a Profile as profile to collect instruction counts, or a Tracer
+    as trace to keep the most recent instructions (compiled blocks are
+    not used by instrumented VMs).
+    """
+    vm = IntcodeVM(program, input_q=input_q, input_f=input_f, idle_input=idle_input, memory=memory, jit=jit,
+                   profile=profile, trace=trace)
+    return vm.outputs()
@@ -0,0 +1,216 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Static disassembly and control flow analysis of Intcode programs."""
+
+from collections import namedtuple
+
+from intcode import decode, format_instruction
+
+
+Block = namedtuple('Block', ['start', 'end', 'pcs', 'successors'])
+
+
+class Analysis(object):
+    """Result of analyze().
+
+    instructions maps the pc of every instruction found to its decoded
+    Instruction, and blocks maps the start of every basic block to a Block
+    whose successors are the possible next block starts (None for a jump
+    to a computed address). owner maps every code address to the pc of
+    the instruction covering it. modified is the set of instruction pcs which
+    the program writes to through an absolute address, writers maps each
+    of them to the writing pcs, and dynamic_writes holds the pcs which
+    write through the relative base. data lists the (start, end) address
+    ranges which are not code.
+    """
+
+    def __init__(self, program):
+        self.size = len(program)
+        self.instructions = {}
+        self.owner = {}
+        self.blocks = {}
+        self.modified = set()
+        self.writers = {}
+        self.dynamic_writes = set()
+        self.data = []
+
+    def is_code(self, addr):
+        return addr in self.owner
+
+    def format(self):
+        """Return a listing of the program, one block or data region per paragraph."""
+        regions = [(start, 'code') for start in self.blocks] + [(start, 'data') for start, _ in self.data]
+        ends = dict(self.data)
+        lines = []
+        for start, kind in sorted(regions):
+            if kind == 'data':
+                lines.append(f'{start:6}: data x{ends[start] - start}')
+                continue
+            block = self.blocks[start]
+            succ = ' '.join('?' if s is None else str(s) for s in block.successors)
+            lines.append(f'block {start} -> {succ or "halt"}')
+            for pc in block.pcs:
+                mark = '*' if pc in self.modified else ' '
+                lines.append(f'{pc:6}:{mark} {format_instruction(self.instructions[pc])}')
+        return '\n'.join(lines)
+
+
+def _successors(ins, pc):
+    """Return the possible next pcs of an instruction (None if computed)."""
+    opcode, size, a, b, _, mode_a, mode_b, _ = ins
+    if opcode == 99:
+        return []
+    if opcode not in (5, 6):
+        return [pc + size]
+    target = b if mode_b == 1 else None
+    if mode_a == 1:
+        if (opcode == 5) == (a != 0):
+            return [target]
+        return [pc + size]
+    return [pc + size, target]
+
+
+def _constant(ins):
+    """Return the value stored by an instruction with only immediate inputs."""
+    opcode, _, a, b, _, mode_a, mode_b, _ = ins
+    if opcode in (1, 2) and mode_a == 1 and mode_b == 1:
+        return a + b if opcode == 1 else a * b
+    return None
+
+
+def _trace(program, owner, start, strict=True):
+    """Decode the code reachable from start which is not in owner yet.
+
+    Returns the new instructions found and the addresses they cover. A
+    path which cannot be decoded or runs into the middle of a known
+    instruction is abandoned, unless strict is False, in which case the
+    whole trace is rejected and None returned.
+    """
+    found = {}
+    claimed = {}
+    stack = [start]
+    while stack:
+        pc = stack.pop()
+        if pc is None or owner.get(pc, claimed.get(pc)) == pc:
+            continue
+        try:
+            if not 0 <= pc < len(program) or pc in owner or pc in claimed:
+                raise ValueError(f'bad instruction address {pc}')
+            ins = decode(program, pc)
+            if any(addr in owner or addr in claimed for addr in range(pc, pc + ins.size)):
+                raise ValueError(f'overlapping instruction at {pc}')
+        except ValueError:
+            if not strict:
+                return None
+            continue
+        found[pc] = ins
+        for addr in range(pc, pc + ins.size):
+            claimed[addr] = pc
+        stack.extend(_successors(ins, pc))
+    return found, claimed
+
+
+def analyze(program):
+    """Disassemble program by recursive traversal from address 0.
+
+    Besides jump targets, constants stored by add/mul instructions with
+    immediate inputs are tried as entry points, since that is how return
+    addresses are pushed; a candidate is dropped unless everything
+    reachable from it decodes cleanly.
+    """
+    analysis = Analysis(program)
+    instructions = analysis.instructions
+    owner = analysis.owner
+    candidates = [0]
+    tried = set()
+    while candidates:
+        start = candidates.pop()
+        if start in tried:
+            continue
+        tried.add(start)
+        result = _trace(program, owner, start, strict=start == 0)
+        if not result:
+            continue
+        found, claimed = result
+        instructions.update(found)
+        owner.update(claimed)
+        for ins in found.values():
+            value = _constant(ins)
+            if value is not None and value not in tried:
+                candidates.append(value)
+
+    # basic blocks start at the entry, jump targets and after jumps
+    leaders = {0}
+    for pc, ins in instructions.items():
+        succ = _successors(ins, pc)
+        if ins.opcode in (5, 6, 99):
+            leaders.update(s for s in succ if s is not None)
+            leaders.add(pc + ins.size)
+    for pc in tried:
+        if pc in instructions:
+            leaders.add(pc)
+    for start in sorted(leaders):
+        if start not in instructions:
+            continue
+        pcs = []
+        pc = start
+        while True:
+            ins = instructions[pc]
+            pcs.append(pc)
+            succ = _successors(ins, pc)
+            if ins.opcode in (5, 6, 99) or succ[0] in leaders or succ[0] not in instructions:
+                successors = [s for s in succ if s is None or s in instructions]
+                break
+            pc = succ[0]
+        analysis.blocks[start] = Block(start, pc + ins.size, pcs, successors)
+
+    for pc, ins in instructions.items():
+        opcode, _, a, _, c, mode_a, _, mode_c = ins
+        if opcode in (1, 2, 7, 8):
+            addr, mode = c, mode_c
+        elif opcode == 3:
+            addr, mode = a, mode_a
+        else:
+            continue
+        if mode == 2:
+            analysis.dynamic_writes.add(pc)
+        elif addr in owner:
+            analysis.modified.add(owner[addr])
+            analysis.writers.setdefault(owner[addr], []).append(pc)
+
+    start = None
+    for addr in range(len(program) + 1):
+        if addr < len(program) and addr not in owner:
+            if start is None:
+                start = addr
+        elif start is not None:
+            analysis.data.append((start, addr))
+            start = None
+    return analysis
+
+
+def main():
+    """Main entry point."""
+    import argparse
+    import fileinput
+    import time
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('infile', help='Intcode program to disassemble ("-" for stdin)')
+    args = parser.parse_args()
+    try:
+        program = [int(x) for x in ''.join(fileinput.input(args.infile)).split(',') if x.strip()]
+        started = time.perf_counter()
+        analysis = analyze(program)
+        elapsed = time.perf_counter() - started
+        print(analysis.format())
+        print()
+        print(f'{len(analysis.instructions)} instructions in {len(analysis.blocks)} blocks, '
+              f'{sum(end - start for start, end in analysis.data)} data words, '
+              f'{len(analysis.modified)} self-modified instructions ({elapsed:.3f}s)')
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
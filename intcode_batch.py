@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Lockstep Intcode execution of many independent program instances."""
+
+import numpy as np
+
+from intcode import decode_word
+
+
+RUNNING = 0
+HALTED = 1
+BLOCKED = 2
+
+
+class BatchVM(object):
+    """Run N copies of one Intcode program as rows of an int64 array.
+
+    Every step executes one instruction for all running lanes which are
+    at the lowest pc and have the same instruction word there, so lanes
+    which branch apart are masked out until they line up again. Values
+    are 64-bit, unlike the arbitrary precision scalar VM.
+    """
+
+    def __init__(self, program, lanes, inputs=None, patches=None):
+        self.lanes = lanes
+        self.mem = np.tile(np.asarray(program, dtype=np.int64), (lanes, 1))
+        for addr, values in (patches or {}).items():
+            self.mem[:, addr] = values
+        self.pc = np.zeros(lanes, dtype=np.int64)
+        self.relative_base = np.zeros(lanes, dtype=np.int64)
+        self.status = np.full(lanes, RUNNING, dtype=np.int8)
+        if inputs is None:
+            inputs = np.zeros((lanes, 0), dtype=np.int64)
+        self.inputs = np.asarray(inputs, dtype=np.int64).reshape(lanes, -1)
+        self.input_count = np.zeros(lanes, dtype=np.int64)
+        self.out = np.zeros((lanes, 1), dtype=np.int64)
+        self.output_count = np.zeros(lanes, dtype=np.int64)
+
+    def outputs(self, lane):
+        return self.out[lane, :self.output_count[lane]].tolist()
+
+    def _grow(self, addr):
+        width = self.mem.shape[1]
+        if addr >= width:
+            extra = max(addr + 1, 2 * width) - width
+            self.mem = np.concatenate([self.mem, np.zeros((self.lanes, extra), dtype=np.int64)], axis=1)
+
+    def _address(self, idx, mode, operand):
+        if mode == 2:
+            addr = operand + self.relative_base[idx]
+        else:
+            addr = operand
+        if len(addr):
+            if addr.min() < 0:
+                raise ValueError(f'negative address {addr.min()}')
+            self._grow(int(addr.max()))
+        return addr
+
+    def _read(self, idx, mode, operand):
+        if mode == 1:
+            return operand
+        addr = self._address(idx, mode, operand)
+        return self.mem[idx, addr]
+
+    def step(self):
+        """Execute one instruction for a group of lanes, return False when done."""
+        running = np.flatnonzero(self.status == RUNNING)
+        if not len(running):
+            return False
+        pcs = self.pc[running]
+        pc = int(pcs.min())
+        idx = running[pcs == pc]
+        self._grow(pc + 3)
+        words = self.mem[idx, pc]
+        word = int(words[0])
+        idx = idx[words == word]
+        opcode, size, mode_a, mode_b, mode_c = decode_word(word)
+        a, b, c = (self.mem[idx, pc + i] for i in range(1, 4))
+        if opcode == 99:
+            self.status[idx] = HALTED
+            return True
+        if opcode == 3:
+            waiting = self.input_count[idx] >= self.inputs.shape[1]
+            self.status[idx[waiting]] = BLOCKED
+            idx = idx[~waiting]
+            addr = self._address(idx, mode_a, a[~waiting])
+            self.mem[idx, addr] = self.inputs[idx, self.input_count[idx]]
+            self.input_count[idx] += 1
+            self.pc[idx] += 2
+            return True
+        x = self._read(idx, mode_a, a)
+        if opcode in (1, 2, 7, 8):
+            y = self._read(idx, mode_b, b)
+            if opcode == 1:
+                value = x + y
+            elif opcode == 2:
+                value = x * y
+            elif opcode == 7:
+                value = (x < y).astype(np.int64)
+            else:
+                value = (x == y).astype(np.int64)
+            addr = self._address(idx, mode_c, c)
+            self.mem[idx, addr] = value
+        elif opcode in (5, 6):
+            taken = (x != 0) if opcode == 5 else (x == 0)
+            # only resolve the target for lanes which jump, like the scalar VM
+            self.pc[idx[~taken]] = pc + size
+            self.pc[idx[taken]] = self._read(idx[taken], mode_b, b[taken])
+            return True
+        elif opcode == 4:
+            if self.output_count[idx].max() >= self.out.shape[1]:
+                self.out = np.concatenate([self.out, np.zeros_like(self.out)], axis=1)
+            self.out[idx, self.output_count[idx]] = x
+            self.output_count[idx] += 1
+        else:
+            self.relative_base[idx] += x
+        self.pc[idx] += size
+        return True
+
+    def run(self):
+        """Run until every lane has halted or is blocked on input."""
+        while self.step():
+            pass
+        return self
+
+
+def run_batch(program, inputs=None, patches=None, lanes=None):
+    """Run one lane per row of inputs (or per patch value) and return the BatchVM.
+
+    patches maps an address to the per-lane values stored there before
+    the run starts.
+    """
+    if lanes is None:
+        if inputs is not None:
+            lanes = len(inputs)
+        else:
+            lanes = len(next(iter(patches.values())))
+    return BatchVM(program, lanes, inputs=inputs, patches=patches).run()
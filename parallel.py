@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Process pool search driver."""
+
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+
+def _evaluate(func, chunk):
+    return [func(candidate) for candidate in chunk]
+
+
+def parallel_search(func, candidates, match=None, workers=None, chunksize=1):
+    """Evaluate func over candidates in a process pool.
+
+    Without match, return a list of (candidate, result) pairs in candidate
+    order. With match, return the (candidate, result) pair for the first
+    candidate whose result satisfies match(result), or None. Candidates
+    after a match are cancelled as soon as it is found.
+
+    func must be picklable (a module level function, a partial of one, or
+    a method of a picklable object). workers=1 evaluates everything in the
+    current process, and None uses one worker per CPU. Each pool task
+    evaluates chunksize consecutive candidates, so func is pickled once
+    per chunk; a match cancels whole chunks.
+    """
+    candidates = list(candidates)
+    if workers == 1:
+        results = []
+        for candidate in candidates:
+            result = func(candidate)
+            if match is not None and match(result):
+                return candidate, result
+            results.append((candidate, result))
+        return None if match is not None else results
+
+    results = {}
+    best = None
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = {executor.submit(_evaluate, func, candidates[start:start + chunksize]): start
+                   for start in range(0, len(candidates), chunksize)}
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                start = pending.pop(future)
+                for i, result in enumerate(future.result(), start):
+                    results[i] = result
+                    if match is not None and match(result) and (best is None or i < best):
+                        best = i
+            if best is not None:
+                # only earlier candidates can still beat the current match
+                for future, start in list(pending.items()):
+                    if start > best:
+                        future.cancel()
+                        del pending[future]
+    if match is not None:
+        if best is None:
+            return None
+        return candidates[best], results[best]
+    return [(candidate, results[i]) for i, candidate in enumerate(candidates)]